@@ -0,0 +1,53 @@
+"""
+Архив прошедших бронирований
+Холодные брони хранятся помесячно в сжатых файлах archive/bookings-YYYY-MM.json.gz
+"""
+
+import os
+import logging
+import threading
+from typing import Dict, List, Tuple
+
+from storage import read_json_file, write_json_file
+
+logger = logging.getLogger(__name__)
+
+
+class BookingArchive:
+    """Помесячные партиции прошедших броней
+
+    Рабочее хранилище (storage.py) держит только брони, которые еще не
+    закончились; все, что старше, переносится сюда и больше не читается при
+    обычных запросах. Запись партиции идемпотентна: брони сливаются по ID,
+    поэтому повторный перенос после сбоя не создает дублей.
+    """
+
+    def __init__(self, data_dir: str, durable: bool = False):
+        self.archive_dir = os.path.join(data_dir, "archive")
+        self.durable = durable
+        self.lock = threading.Lock()
+
+    def partition_file(self, year: int, month: int) -> str:
+        return os.path.join(self.archive_dir, f"bookings-{year:04d}-{month:02d}.json.gz")
+
+    @staticmethod
+    def partition_key(record: Dict) -> Tuple[int, int]:
+        """Месяц партиции брони - по дате начала"""
+        return int(record['start_time'][:4]), int(record['start_time'][5:7])
+
+    def append(self, records: List[Dict]) -> Dict[Tuple[int, int], int]:
+        """Дописать записи броней в партиции их месяцев; возвращает {месяц: сколько добавлено}"""
+        by_month: Dict[Tuple[int, int], List[Dict]] = {}
+        for record in records:
+            by_month.setdefault(self.partition_key(record), []).append(record)
+
+        with self.lock:
+            for (year, month), month_records in sorted(by_month.items()):
+                filepath = self.partition_file(year, month)
+                merged = {r['id']: r for r in read_json_file(filepath, [])}
+                merged.update((r['id'], r) for r in month_records)
+                write_json_file(filepath,
+                                sorted(merged.values(), key=lambda r: (r['start_time'], r['id'])),
+                                durable=self.durable)
+                logger.info(f"🗄 Архив {year:04d}-{month:02d}: +{len(month_records)} броней")
+        return {month: len(month_records) for month, month_records in by_month.items()}
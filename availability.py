@@ -0,0 +1,255 @@
+"""
+Индексы занятости переговорных комнат
+Отсортированные интервалы броней по дням для быстрых проверок пересечений
+и битовые карты занятости слотов рабочего дня - отдельно для каждой комнаты
+"""
+
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from config import ROOM_OPEN_HOUR, ROOM_CLOSE_HOUR, TIME_SLOT_INTERVAL
+from models import Booking
+
+
+def booking_days(start: datetime, end: datetime) -> Iterator[date]:
+    """Все даты, которые затрагивает интервал [start, end) — с учетом перехода через полночь"""
+    day = start.date()
+    last_day = (end - timedelta(microseconds=1)).date() if end > start else day
+    while day <= last_day:
+        yield day
+        day += timedelta(days=1)
+
+
+class DayIntervals:
+    """Отсортированные по началу интервалы активных броней одного дня
+
+    Рядом с концами хранится префиксный максимум, поэтому поиск пересечения —
+    это один bisect, даже если в старых данных интервалы перекрываются.
+    """
+
+    __slots__ = ('starts', 'ends', 'max_ends', 'bookings')
+
+    def __init__(self):
+        self.starts: List[datetime] = []
+        self.ends: List[datetime] = []
+        self.max_ends: List[datetime] = []
+        self.bookings: List[Booking] = []
+
+    def __len__(self):
+        return len(self.starts)
+
+    def _rebuild_max_ends(self, index: int):
+        """Пересчитать префиксный максимум концов начиная с позиции index"""
+        del self.max_ends[index:]
+        current = self.max_ends[-1] if self.max_ends else None
+        for end in self.ends[index:]:
+            current = end if current is None or end > current else current
+            self.max_ends.append(current)
+
+    def add(self, start: datetime, end: datetime, booking: Booking):
+        """Добавить интервал брони"""
+        index = bisect_right(self.starts, start)
+        self.starts.insert(index, start)
+        self.ends.insert(index, end)
+        self.bookings.insert(index, booking)
+        self._rebuild_max_ends(index)
+
+    def remove(self, booking: Booking) -> bool:
+        """Удалить интервал брони (по объекту: у вхождений одной серии общий ID)"""
+        for index, indexed in enumerate(self.bookings):
+            if indexed is booking:
+                del self.starts[index]
+                del self.ends[index]
+                del self.bookings[index]
+                self._rebuild_max_ends(index)
+                return True
+        return False
+
+    def find_overlap(self, start: datetime, end: datetime) -> Optional[Booking]:
+        """Найти бронь, пересекающуюся с [start, end), или None"""
+        # Кандидаты — интервалы, начинающиеся раньше end
+        index = bisect_left(self.starts, end)
+        if index == 0 or self.max_ends[index - 1] <= start:
+            return None
+        for i in range(index - 1, -1, -1):
+            if self.ends[i] > start:
+                return self.bookings[i]
+        return None
+
+    def gaps(self, since: datetime, until: datetime) -> Iterator[Tuple[datetime, datetime]]:
+        """Свободные промежутки внутри [since, until) по порядку"""
+        # Интервалы, закончившиеся до since, пропускаем bisect'ом по префиксному максимуму
+        index = bisect_right(self.max_ends, since)
+        cursor = since
+        for start, end in zip(self.starts[index:], self.ends[index:]):
+            if start >= until:
+                break
+            if start > cursor:
+                yield cursor, start
+            if end > cursor:
+                cursor = end
+        if cursor < until:
+            yield cursor, until
+
+
+class SlotGrid:
+    """Сетка слотов рабочего дня: бит i маски - слот, начинающийся в open + i * interval
+
+    Занятость дня хранится одним int, поэтому свободные слоты и «с каких слотов
+    помещается встреча на D минут» считаются побитовыми операциями сразу для всего дня.
+    """
+
+    def __init__(self, open_hour: int, close_hour: int, interval: int):
+        self.open_hour = open_hour
+        self.close_hour = close_hour
+        self.interval = interval
+        self.size = (close_hour - open_hour) * 60 // interval
+        self.full_mask = (1 << self.size) - 1
+
+    def slot_times(self, day: date) -> List[datetime]:
+        """Время начала каждого слота дня"""
+        day_start = datetime.combine(day, time(self.open_hour))
+        return [day_start + timedelta(minutes=i * self.interval) for i in range(self.size)]
+
+    def mask_for(self, day: date, start: datetime, end: datetime) -> int:
+        """Биты слотов дня day, которые пересекаются с интервалом [start, end)"""
+        day_start = datetime.combine(day, time(self.open_hour))
+        first = int((start - day_start).total_seconds() // 60) // self.interval
+        minutes_to_end = (end - day_start).total_seconds() / 60
+        last = -int(-minutes_to_end // self.interval) - 1  # округление вверх
+        first = max(first, 0)
+        last = min(last, self.size - 1)
+        if first > last:
+            return 0
+        return ((1 << (last - first + 1)) - 1) << first
+
+    def slots_for(self, minutes: int) -> int:
+        """Сколько слотов занимает встреча заданной длительности"""
+        return -(-minutes // self.interval)
+
+    def day_bounds(self, day: date) -> Tuple[datetime, datetime]:
+        """Открытие и закрытие комнаты в этот день"""
+        return datetime.combine(day, time(self.open_hour)), datetime.combine(day, time(self.close_hour))
+
+    def align_up(self, moment: datetime) -> datetime:
+        """Ближайшее начало слота не раньше moment (до открытия - открытие)"""
+        day_start = datetime.combine(moment.date(), time(self.open_hour))
+        if moment <= day_start:
+            return day_start
+        step = timedelta(minutes=self.interval)
+        return day_start + -((day_start - moment) // step) * step
+
+    def slot_index(self, moment: datetime) -> Optional[int]:
+        """Номер слота, который начинается ровно в moment, или None"""
+        minutes = (moment.hour - self.open_hour) * 60 + moment.minute
+        if moment.second or moment.microsecond or minutes % self.interval:
+            return None
+        index = minutes // self.interval
+        return index if 0 <= index < self.size else None
+
+    def free_runs(self, free_mask: int) -> List[int]:
+        """Длина свободного отрезка (в слотах) от каждого слота до занятого слота или закрытия"""
+        runs = [0] * self.size
+        run = 0
+        for i in range(self.size - 1, -1, -1):
+            run = run + 1 if free_mask >> i & 1 else 0
+            runs[i] = run
+        return runs
+
+    def startable(self, free_mask: int, minutes: int) -> int:
+        """Маска слотов, с которых свободно minutes минут подряд (до закрытия комнаты)"""
+        result = free_mask
+        for shift in range(1, self.slots_for(minutes)):
+            result &= free_mask >> shift
+        return result
+
+
+# Сетка из настроек комнаты
+DAY_GRID = SlotGrid(ROOM_OPEN_HOUR, ROOM_CLOSE_HOUR, TIME_SLOT_INTERVAL)
+
+
+class RoomOccupancy:
+    """Занятость одной комнаты: интервалы активных броней и карты слотов по дням"""
+
+    __slots__ = ('days', 'bitmaps')
+
+    def __init__(self):
+        self.days: Dict[date, DayIntervals] = {}
+        self.bitmaps: Dict[date, int] = {}
+
+    def add(self, booking: Booking):
+        """Добавить активную бронь во все дни, которые она затрагивает"""
+        for day in booking_days(booking.start, booking.end):
+            self.days.setdefault(day, DayIntervals()).add(booking.start, booking.end, booking)
+            mask = self.bitmaps.get(day, 0) | DAY_GRID.mask_for(day, booking.start, booking.end)
+            if mask:
+                self.bitmaps[day] = mask
+
+    def remove(self, booking: Booking):
+        """Убрать бронь и пересчитать карты затронутых дней"""
+        for day in booking_days(booking.start, booking.end):
+            intervals = self.days.get(day)
+            if intervals is not None:
+                intervals.remove(booking)
+                if not intervals:
+                    del self.days[day]
+            self.rebuild_bitmap(day)
+
+    def rebuild_bitmap(self, day: date):
+        """Пересчитать карту занятости дня по его интервалам"""
+        mask = 0
+        intervals = self.days.get(day)
+        if intervals is not None:
+            for start, end in zip(intervals.starts, intervals.ends):
+                mask |= DAY_GRID.mask_for(day, start, end)
+        if mask:
+            self.bitmaps[day] = mask
+        else:
+            self.bitmaps.pop(day, None)
+
+    def rebuild_day(self, day: date, bookings: List[Booking]):
+        """Заменить индекс дня бронями bookings"""
+        intervals = DayIntervals()
+        for booking in bookings:
+            intervals.add(booking.start, booking.end, booking)
+        if intervals:
+            self.days[day] = intervals
+        else:
+            self.days.pop(day, None)
+        self.rebuild_bitmap(day)
+
+    def find_overlap(self, start: datetime, end: datetime) -> Optional[Booking]:
+        """Найти бронь, пересекающуюся с [start, end), или None"""
+        for day in booking_days(start, end):
+            intervals = self.days.get(day)
+            if intervals is not None:
+                booking = intervals.find_overlap(start, end)
+                if booking is not None:
+                    return booking
+        return None
+
+    def starting_on(self, day: date) -> List[Booking]:
+        """Брони, начинающиеся в этот день (в индексе дня есть и начавшиеся накануне)"""
+        intervals = self.days.get(day)
+        if intervals is None:
+            return []
+        return [booking for start, booking in zip(intervals.starts, intervals.bookings) if start.date() == day]
+
+    def free_windows(self, day: date, minutes: int, since: datetime) -> Iterator[datetime]:
+        """Начало самого раннего слота в каждом свободном промежутке дня, где помещается встреча на minutes минут"""
+        open_at, close_at = DAY_GRID.day_bounds(day)
+        since = max(since, open_at)
+        if since >= close_at:
+            return
+        duration = timedelta(minutes=minutes)
+        intervals = self.days.get(day)
+        gaps = intervals.gaps(since, close_at) if intervals is not None else [(since, close_at)]
+        for gap_start, gap_end in gaps:
+            start = DAY_GRID.align_up(gap_start)
+            if start + duration <= gap_end:
+                yield start
+
+    def free_mask(self, day: date) -> int:
+        """Маска свободных слотов дня"""
+        return ~self.bitmaps.get(day, 0) & DAY_GRID.full_mask
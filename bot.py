@@ -3,7 +3,12 @@ Telegram бот для резервации митинг-рума
 Удобный интерфейс для бронирования переговорной комнаты
 """
 
+import asyncio
+import hmac
+import json
 import logging
+import secrets
+import signal
 from datetime import datetime, timedelta, timezone
 
 BAKU_TZ = timezone(timedelta(hours=4))
@@ -14,6 +19,7 @@ def now_baku():
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
     Application,
+    BaseHandler,
     CommandHandler,
     CallbackQueryHandler,
     ConversationHandler,
@@ -22,9 +28,29 @@ from telegram.ext import (
     filters,
     ContextTypes,
 )
-from database import Database
-from config import BOT_TOKEN, GROUP_CHAT_ID
+from database import Database, AsyncDatabase, BookingResult, get_database
+from availability import DAY_GRID
+from digest import WeekDigest
+from models import Recurrence, RecurrenceFreq
+from maintenance import Maintenance
+from reminders import Outbox, ReminderQueue
+from update_processor import PerUserUpdateProcessor
+from config import (
+    BOT_TOKEN, GROUP_CHAT_ID, BOOKING_DURATIONS, REMINDER_MINUTES_BEFORE, REMINDER_TICK_SECONDS,
+    ROOMS, DEFAULT_ROOM, MAX_BOOKING_DAYS, SERIES_COUNT_OPTIONS,
+    BOT_MODE, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_SECRET_TOKEN, WEBHOOK_LOCAL,
+)
 from translations import get_text, get_weekday, get_month
+from keyboards import (
+    main_menu_keyboard,
+    group_menu_keyboard,
+    language_keyboard,
+    back_to_menu_keyboard,
+    duration_button,
+    booking_done_keyboard,
+    next_free_duration_keyboard,
+    page_nav_row,
+)
 
 # Настройка логирования
 logging.basicConfig(
@@ -34,12 +60,12 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Состояния для ConversationHandler
-SELECTING_LANGUAGE, SELECTING_DATE, SELECTING_TIME, ENTERING_DURATION, ENTERING_DESCRIPTION = range(5)
+SELECTING_LANGUAGE, SELECTING_DATE, SELECTING_TIME, ENTERING_DURATION, ENTERING_DESCRIPTION, SELECTING_ROOM = range(6)
 
-# Инициализация базы данных
+# Инициализация базы данных (один экземпляр и одна блокировка на процесс)
 logger.info("Инициализация базы данных...")
 try:
-    db = Database()
+    db = get_database()
     logger.info("✅ База данных успешно инициализирована")
 except Exception as e:
     logger.error(f"❌ Ошибка инициализации БД: {e}")
@@ -49,8 +75,17 @@ except Exception as e:
 class MeetingRoomBot:
     """Класс для управления ботом бронирования переговорной"""
     
-    def __init__(self):
-        self.db = Database()
+    def __init__(self, database: Database):
+        # Обработчики обращаются к общему хранилищу через асинхронный фасад
+        self.db = AsyncDatabase(database)
+        # Фрагменты сводки броней по дням и языкам (см. digest.py)
+        self.digest = WeekDigest(self._format_date)
+        # Напоминания: очередь строится из хранилища и дальше обновляется событиями броней
+        self.reminders = ReminderQueue()
+        self.reminders.rebuild(database.get_upcoming_bookings(MAX_BOOKING_DAYS), now_baku())
+        self._reminders_extended_on = now_baku().date()
+        database.add_listener(self.reminders.on_booking_event)
+        self.outbox = Outbox()
     
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /start"""
@@ -60,19 +95,13 @@ class MeetingRoomBot:
         # В личном чате всегда показываем выбор языка при первом запуске
         if chat_type == 'private':
             # Проверяем, выбирал ли пользователь язык в личном чате
-            user_lang = self.db.get_user_language(user.id)
+            user_lang = await self.db.get_user_language(user.id)
             
             # Если язык не выбран, показываем выбор
             if not user_lang or user_lang not in ['ru', 'az']:
-                keyboard = [
-                    [InlineKeyboardButton(get_text('ru', 'language_russian'), callback_data="lang_ru")],
-                    [InlineKeyboardButton(get_text('az', 'language_azerbaijani'), callback_data="lang_az")]
-                ]
-                reply_markup = InlineKeyboardMarkup(keyboard)
-                
                 await update.message.reply_text(
                     get_text('ru', 'select_language'),
-                    reply_markup=reply_markup
+                    reply_markup=language_keyboard()
                 )
             else:
                 # Показываем главное меню на выбранном языке
@@ -90,7 +119,7 @@ class MeetingRoomBot:
         language = query.data.split('_')[1]  # lang_ru -> ru
         
         # Сохраняем язык пользователя
-        self.db.set_user_language(
+        await self.db.set_user_language(
             user_id=user.id,
             language=language,
             first_name=user.first_name,
@@ -101,34 +130,18 @@ class MeetingRoomBot:
         await query.answer(get_text(language, 'language_selected'), show_alert=True)
         
         # Показываем главное меню
-        keyboard = [
-            [InlineKeyboardButton(get_text(language, 'btn_view_bookings'), callback_data="view_bookings")],
-            [InlineKeyboardButton(get_text(language, 'btn_create_booking'), callback_data="create_booking")],
-            [InlineKeyboardButton(get_text(language, 'btn_my_bookings'), callback_data="my_bookings")],
-            [InlineKeyboardButton(get_text(language, 'btn_help'), callback_data="help")],
-            [InlineKeyboardButton(get_text(language, 'btn_change_language'), callback_data="change_language")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
         welcome_text = get_text(language, 'welcome', name=user.first_name)
         
-        await query.edit_message_text(welcome_text, reply_markup=reply_markup)
+        await query.edit_message_text(welcome_text, reply_markup=main_menu_keyboard(language))
     
     async def change_language(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Показать меню смены языка"""
         query = update.callback_query
         await query.answer()
         
-        keyboard = [
-            [InlineKeyboardButton(get_text('ru', 'language_russian'), callback_data="lang_ru")],
-            [InlineKeyboardButton(get_text('az', 'language_azerbaijani'), callback_data="lang_az")],
-            [InlineKeyboardButton(get_text('ru', 'btn_back'), callback_data="back_to_menu")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
         await query.edit_message_text(
             get_text('ru', 'select_language'),
-            reply_markup=reply_markup
+            reply_markup=language_keyboard(with_back=True)
         )
     
     async def show_main_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE, lang: str = None, user = None):
@@ -136,17 +149,13 @@ class MeetingRoomBot:
         if not user:
             user = update.effective_user
         if not lang:
-            lang = self.db.get_user_language(user.id)
+            lang = await self.db.get_user_language(user.id)
         
         chat_type = update.effective_chat.type
         
         # В группе показываем упрощенное меню
         if chat_type in ['group', 'supergroup']:
-            keyboard = [
-                [InlineKeyboardButton(get_text(lang, 'btn_view_bookings'), callback_data="view_bookings")],
-                [InlineKeyboardButton("➕ Забронировать (в личном чате)", url=f"https://t.me/{context.bot.username}?start=booking")]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            reply_markup = group_menu_keyboard(lang, context.bot.username)
             
             welcome_text = (
                 f"👋 Бот для бронирования Meeting Room 2A\n\n"
@@ -155,14 +164,7 @@ class MeetingRoomBot:
             )
         else:
             # В личном чате полное меню
-            keyboard = [
-                [InlineKeyboardButton(get_text(lang, 'btn_view_bookings'), callback_data="view_bookings")],
-                [InlineKeyboardButton(get_text(lang, 'btn_create_booking'), callback_data="create_booking")],
-                [InlineKeyboardButton(get_text(lang, 'btn_my_bookings'), callback_data="my_bookings")],
-                [InlineKeyboardButton(get_text(lang, 'btn_help'), callback_data="help")],
-                [InlineKeyboardButton(get_text(lang, 'btn_change_language'), callback_data="change_language")]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            reply_markup = main_menu_keyboard(lang)
             welcome_text = get_text(lang, 'welcome', name=user.first_name)
         
         if update.message:
@@ -176,16 +178,12 @@ class MeetingRoomBot:
         await query.answer()
         
         user = update.effective_user
-        lang = self.db.get_user_language(user.id)
+        lang = await self.db.get_user_language(user.id)
         chat_type = update.effective_chat.type
         
         # В группе показываем упрощенное меню
         if chat_type in ['group', 'supergroup']:
-            keyboard = [
-                [InlineKeyboardButton(get_text(lang, 'btn_view_bookings'), callback_data="view_bookings")],
-                [InlineKeyboardButton("➕ Забронировать (в личном чате)", url=f"https://t.me/{context.bot.username}?start=booking")]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            reply_markup = group_menu_keyboard(lang, context.bot.username)
             
             text = (
                 f"👋 Бот для бронирования Meeting Room 2A\n\n"
@@ -194,14 +192,7 @@ class MeetingRoomBot:
             )
         else:
             # В личном чате полное меню
-            keyboard = [
-                [InlineKeyboardButton(get_text(lang, 'btn_view_bookings'), callback_data="view_bookings")],
-                [InlineKeyboardButton(get_text(lang, 'btn_create_booking'), callback_data="create_booking")],
-                [InlineKeyboardButton(get_text(lang, 'btn_my_bookings'), callback_data="my_bookings")],
-                [InlineKeyboardButton(get_text(lang, 'btn_help'), callback_data="help")],
-                [InlineKeyboardButton(get_text(lang, 'btn_change_language'), callback_data="change_language")]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            reply_markup = main_menu_keyboard(lang)
             text = get_text(lang, 'main_menu')
         
         await query.edit_message_text(
@@ -215,50 +206,46 @@ class MeetingRoomBot:
         await query.answer()
         
         user = update.effective_user
-        lang = self.db.get_user_language(user.id)
+        lang = await self.db.get_user_language(user.id)
         chat_type = update.effective_chat.type
+        # view_bookings_<дата> - листание: страница начинается с этого дня
+        start_day = None
+        if query.data.startswith('view_bookings_'):
+            start_day = datetime.fromisoformat(query.data[len('view_bookings_'):]).date()
+        
+        # Сводка на ближайшие 7 дней: пересобираются только дни, где менялись брони
+        now = now_baku()
+        until = now + timedelta(days=7)
+        days = [now.date() + timedelta(days=i) for i in range((until.date() - now.date()).days + 1)]
+        
+        self.digest.evict_before(now.date())
+        changed = await self.db.get_changed_days(days, self.digest.known_versions(lang, days))
+        self.digest.update(lang, changed)
+        text, prev_day, next_day = self.digest.render(lang, now, until, days, start_day)
+        
+        nav_row = page_nav_row(
+            lang,
+            prev_data=f"view_bookings_{prev_day.isoformat()}" if prev_day else None,
+            next_data=f"view_bookings_{next_day.isoformat()}" if next_day else None,
+        )
         
-        # Получаем брони на ближайшие 7 дней
-        bookings = self.db.get_upcoming_bookings(days=7)
-        
-        if not bookings:
-            text = get_text(lang, 'no_bookings')
-        else:
-            text = get_text(lang, 'upcoming_bookings')
-            current_date = None
-            
-            for booking in bookings:
-                booking_date = datetime.fromisoformat(booking['start_time']).date()
-                
-                # Добавляем заголовок даты
-                if current_date != booking_date:
-                    current_date = booking_date
-                    date_str = self._format_date(booking_date, lang)
-                    text += f"\n<b>{date_str}</b>\n"
-                
-                start = datetime.fromisoformat(booking['start_time'])
-                end = datetime.fromisoformat(booking['end_time'])
-                
-                text += (
-                    f"⏰ {start.strftime('%H:%M')} - {end.strftime('%H:%M')}\n"
-                    f"👤 {booking['user_name']}\n"
-                    f"📝 {booking['description']}\n"
-                    f"{'─' * 30}\n"
-                )
-        
-        # В группе отправляем новое сообщение без кнопок
+        # В группе отправляем новое сообщение без кнопок (кроме листания);
+        # листание меняет уже отправленную сводку
         if chat_type in ['group', 'supergroup']:
-            await query.message.reply_text(
+            send = query.message.reply_text if start_day is None else query.edit_message_text
+            await send(
                 text,
-                reply_markup=InlineKeyboardMarkup([]),
+                reply_markup=InlineKeyboardMarkup([nav_row] if nav_row else []),
                 parse_mode='HTML'
             )
         else:
             # В личке — с кнопкой назад
-            keyboard = [[InlineKeyboardButton(get_text(lang, 'btn_back'), callback_data="back_to_menu")]]
+            reply_markup = back_to_menu_keyboard(lang)
+            if nav_row:
+                reply_markup = InlineKeyboardMarkup([nav_row, *reply_markup.inline_keyboard])
             await query.edit_message_text(
                 text,
-                reply_markup=InlineKeyboardMarkup(keyboard),
+                reply_markup=reply_markup,
                 parse_mode='HTML'
             )
     
@@ -268,7 +255,8 @@ class MeetingRoomBot:
         await query.answer()
         
         user = update.effective_user
-        lang = self.db.get_user_language(user.id)
+        lang = await self.db.get_user_language(user.id)
+        context.user_data.pop('booking_repeat', None)
         
         # Создаем клавиатуру с датами на неделю вперед
         keyboard = []
@@ -299,38 +287,105 @@ class MeetingRoomBot:
         
         return SELECTING_DATE
     
+    async def next_free(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Ближайшие свободные окна: /next [минуты] или кнопка меню"""
+        if update.effective_chat.type != 'private':
+            return  # в группе бот не отвечает на команды
+        
+        user = update.effective_user
+        lang = await self.db.get_user_language(user.id)
+        query = update.callback_query
+        
+        # next_free_<минуты> - длительность уже выбрана
+        minutes = None
+        if query is not None:
+            await query.answer()
+            if query.data.startswith('next_free_'):
+                minutes = int(query.data.split('_')[2])
+        elif context.args and context.args[0].isdigit():
+            minutes = int(context.args[0])
+        
+        if minutes not in BOOKING_DURATIONS:
+            text = get_text(lang, 'next_free_duration')
+            reply_markup = next_free_duration_keyboard(lang)
+        else:
+            # Все окна - один запрос к индексам занятости вместо перебора дат и слотов
+            windows = await self.db.find_free_windows(minutes)
+            if not windows:
+                text = get_text(lang, 'next_free_none', days=MAX_BOOKING_DAYS)
+                reply_markup = next_free_duration_keyboard(lang)
+            else:
+                text = get_text(lang, 'next_free_title', duration=get_text(lang, f'duration_{minutes}'))
+                keyboard = []
+                for window in windows:
+                    button_text = get_text(
+                        lang, 'btn_free_window',
+                        date=self._format_date(window.start.date(), lang),
+                        start_time=window.start.strftime('%H:%M'),
+                        end_time=window.end.strftime('%H:%M')
+                    )
+                    if len(ROOMS) > 1:
+                        button_text += f" 🚪 {ROOMS.get(window.room_id, window.room_id)}"
+                    keyboard.append([InlineKeyboardButton(
+                        button_text,
+                        callback_data=f"window_{window.start.strftime('%Y-%m-%dT%H:%M')}_{minutes}_{window.room_id}"
+                    )])
+                keyboard.append([InlineKeyboardButton(get_text(lang, 'btn_back'), callback_data="next_free")])
+                reply_markup = InlineKeyboardMarkup(keyboard)
+        
+        if query is not None:
+            await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='HTML')
+        else:
+            await update.message.reply_text(text, reply_markup=reply_markup, parse_mode='HTML')
+    
+    async def book_window(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Окно из /next выбрано - дата, время, длительность и комната уже известны"""
+        query = update.callback_query
+        
+        # window_<YYYY-MM-DDTHH:MM>_<минуты>_<комната>
+        _, start, minutes, room_id = query.data.split('_', 3)
+        start_time = datetime.fromisoformat(start)
+        context.user_data['booking_date'] = start_time.date().isoformat()
+        context.user_data['booking_time'] = start_time.strftime('%H:%M')
+        context.user_data['booking_duration'] = int(minutes)
+        context.user_data['booking_room'] = room_id
+        context.user_data.pop('booking_repeat', None)
+        
+        # Занятость еще раз проверится атомарно при сохранении брони
+        return await self.enter_description(update, context)
+    
     async def select_time(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Выбор времени начала"""
         query = update.callback_query
         await query.answer()
         
         user = update.effective_user
-        lang = self.db.get_user_language(user.id)
+        lang = await self.db.get_user_language(user.id)
         
         # Сохраняем выбранную дату
         selected_date = query.data.split('_')[1]
         context.user_data['booking_date'] = selected_date
         
-        # Получаем занятые слоты на выбранную дату
-        bookings = self.db.get_bookings_by_date(selected_date)
-        
-        # Создаем клавиатуру с временными слотами (с 8:00 до 20:00)
+        # Создаем клавиатуру с временными слотами (ROOM_OPEN_HOUR - ROOM_CLOSE_HOUR)
         keyboard = []
         date_obj = datetime.fromisoformat(selected_date).date()
         
-        for hour in range(8, 20):
-            for minute in [0, 30]:
-                time_str = f"{hour:02d}:{minute:02d}"
-                time_obj = datetime.combine(date_obj, datetime.strptime(time_str, "%H:%M").time())
-                
-                # Проверяем, доступно ли это время (не прошло и не занято)
-                is_available = self._is_time_available(time_obj, bookings) and time_obj > now_baku()
-                
-                button_text = f"{'✅' if is_available else '❌'} {time_str}"
-                keyboard.append([InlineKeyboardButton(
-                    button_text,
-                    callback_data=f"time_{time_str}" if is_available else "occupied"
-                )])
+        # Свободные слоты всего дня - одна битовая маска (слот свободен хотя бы в одной комнате)
+        free_mask = await self.db.get_free_slots_mask(selected_date)
+        now = now_baku()
+        
+        for i, time_obj in enumerate(DAY_GRID.slot_times(date_obj)):
+            is_free = bool(free_mask >> i & 1)
+            time_str = time_obj.strftime('%H:%M')
+            
+            # Проверяем, доступно ли это время (не прошло и не занято)
+            is_available = is_free and time_obj > now
+            
+            button_text = f"{'✅' if is_available else '❌'} {time_str}"
+            keyboard.append([InlineKeyboardButton(
+                button_text,
+                callback_data=f"time_{time_str}" if is_available else "occupied"
+            )])
         
         keyboard.append([InlineKeyboardButton(get_text(lang, 'btn_back'), callback_data="create_booking")])
         reply_markup = InlineKeyboardMarkup(keyboard)
@@ -349,27 +404,30 @@ class MeetingRoomBot:
         query = update.callback_query
         
         user = update.effective_user
-        lang = self.db.get_user_language(user.id)
+        lang = await self.db.get_user_language(user.id)
         
         if query.data == "occupied":
             await query.answer(get_text(lang, 'time_occupied'), show_alert=True)
             return SELECTING_TIME
         
+        selected_time = query.data.split('_')[1]
+        
+        # Предлагаем только длительности, которые помещаются в свободный отрезок
+        free_minutes = await self.db.get_free_run(context.user_data['booking_date'], selected_time)
+        durations = [minutes for minutes in BOOKING_DURATIONS if minutes <= free_minutes]
+        if not durations:
+            # Слот успели занять, пока пользователь выбирал
+            await query.answer(get_text(lang, 'time_occupied'), show_alert=True)
+            return SELECTING_TIME
+        
         await query.answer()
         
         # Сохраняем выбранное время
-        selected_time = query.data.split('_')[1]
         context.user_data['booking_time'] = selected_time
         
-        # Создаем клавиатуру с вариантами длительности
-        keyboard = [
-            [InlineKeyboardButton(get_text(lang, 'duration_30'), callback_data="duration_30")],
-            [InlineKeyboardButton(get_text(lang, 'duration_60'), callback_data="duration_60")],
-            [InlineKeyboardButton(get_text(lang, 'duration_90'), callback_data="duration_90")],
-            [InlineKeyboardButton(get_text(lang, 'duration_120'), callback_data="duration_120")],
-            [InlineKeyboardButton(get_text(lang, 'duration_180'), callback_data="duration_180")],
-            [InlineKeyboardButton(get_text(lang, 'btn_back'), callback_data=f"date_{context.user_data['booking_date']}")]
-        ]
+        # Кнопки длительности закэшированы, добавляем только «Назад» к дате
+        keyboard = [[duration_button(lang, minutes)] for minutes in durations]
+        keyboard.append([InlineKeyboardButton(get_text(lang, 'btn_back'), callback_data=f"date_{context.user_data['booking_date']}")])
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         await query.edit_message_text(
@@ -380,58 +438,175 @@ class MeetingRoomBot:
         
         return ENTERING_DURATION
     
+    def _booking_interval(self, context: ContextTypes.DEFAULT_TYPE):
+        """Начало и конец брони из выбранных даты, времени и длительности"""
+        start_time = datetime.fromisoformat(f"{context.user_data['booking_date']}T{context.user_data['booking_time']}")
+        return start_time, start_time + timedelta(minutes=context.user_data['booking_duration'])
+    
+    async def select_room(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Выбор комнаты (если комната одна - сразу к описанию)"""
+        query = update.callback_query
+        
+        # Сохраняем длительность
+        context.user_data['booking_duration'] = int(query.data.split('_')[1])
+        if len(ROOMS) == 1:
+            context.user_data['booking_room'] = DEFAULT_ROOM
+            return await self.enter_description(update, context)
+        
+        user = update.effective_user
+        lang = await self.db.get_user_language(user.id)
+        
+        # Свободные на весь интервал комнаты - один проход по индексам комнат
+        start_time, end_time = self._booking_interval(context)
+        free_rooms = await self.db.find_free_rooms(start_time, end_time)
+        if not free_rooms:
+            await query.answer(get_text(lang, 'time_occupied'), show_alert=True)
+            return ENTERING_DURATION
+        
+        await query.answer()
+        
+        keyboard = [[InlineKeyboardButton(f"🚪 {ROOMS[room_id]}", callback_data=f"room_{room_id}")]
+                    for room_id in free_rooms]
+        keyboard.append([InlineKeyboardButton(get_text(lang, 'btn_any_room'), callback_data="room_*")])
+        keyboard.append([InlineKeyboardButton(get_text(lang, 'btn_back'), callback_data=f"date_{context.user_data['booking_date']}")])
+        
+        await query.edit_message_text(
+            get_text(
+                lang, 'select_room',
+                start_time=start_time.strftime('%H:%M'),
+                end_time=end_time.strftime('%H:%M')
+            ),
+            reply_markup=InlineKeyboardMarkup(keyboard),
+            parse_mode='HTML'
+        )
+        
+        return SELECTING_ROOM
+    
     async def enter_description(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Запросить описание встречи"""
         query = update.callback_query
         await query.answer()
         
         user = update.effective_user
-        lang = self.db.get_user_language(user.id)
+        lang = await self.db.get_user_language(user.id)
         
-        # Сохраняем длительность
-        duration = int(query.data.split('_')[1])
-        context.user_data['booking_duration'] = duration
+        # Сохраняем комнату (room_* - любая свободная, выбирается при сохранении)
+        if query.data.startswith('room_'):
+            room_id = query.data.split('_', 1)[1]
+            context.user_data['booking_room'] = None if room_id == '*' else room_id
         
-        # Вычисляем время окончания
-        date_str = context.user_data['booking_date']
-        time_str = context.user_data['booking_time']
-        start_time = datetime.fromisoformat(f"{date_str}T{time_str}")
-        end_time = start_time + timedelta(minutes=duration)
+        # Вычисляем время начала и окончания
+        duration = context.user_data['booking_duration']
+        start_time, end_time = self._booking_interval(context)
         
-        keyboard = [[InlineKeyboardButton(get_text(lang, 'btn_cancel'), callback_data="create_booking")]]
+        keyboard = [
+            [InlineKeyboardButton(get_text(lang, 'btn_repeat'), callback_data="repeat")],
+            [InlineKeyboardButton(get_text(lang, 'btn_cancel'), callback_data="create_booking")]
+        ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
+        text = get_text(
+            lang, 'enter_description',
+            date=self._format_date(start_time.date(), lang),
+            start_time=start_time.strftime('%H:%M'),
+            end_time=end_time.strftime('%H:%M'),
+            duration=duration
+        )
+        recurrence = self._booking_recurrence(context)
+        if recurrence is not None:
+            text += "\n\n" + get_text(lang, 'repeat_label', rule=self._format_recurrence(recurrence, lang))
+        
         await query.edit_message_text(
-            get_text(
-                lang, 'enter_description',
-                date=self._format_date(start_time.date(), lang),
-                start_time=start_time.strftime('%H:%M'),
-                end_time=end_time.strftime('%H:%M'),
-                duration=duration
-            ),
+            text,
             reply_markup=reply_markup,
             parse_mode='HTML'
         )
         
         return ENTERING_DESCRIPTION
     
-    async def send_group_notification(self, context: ContextTypes.DEFAULT_TYPE, user, start_time, end_time, description):
-        """Отправить уведомление о новой брони в группу"""
+    async def select_repeat(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Повторение брони: repeat - частота, repeat_<частота> - число раз, дальше снова к описанию"""
+        query = update.callback_query
+        parts = query.data.split('_')
+        
+        # repeat_<частота>_<раз> (0 - без окончания), repeat_none, repeat_back - выбор сделан
+        if len(parts) == 3 or parts[1:] in (['none'], ['back']):
+            if parts[1] == 'none':
+                context.user_data.pop('booking_repeat', None)
+            elif len(parts) == 3:
+                context.user_data['booking_repeat'] = (parts[1], int(parts[2]) or None)
+            return await self.enter_description(update, context)
+        
+        await query.answer()
+        
+        user = update.effective_user
+        lang = await self.db.get_user_language(user.id)
+        
+        if len(parts) == 1:
+            # «По будням» - только если первая встреча в будний день
+            start_time, _ = self._booking_interval(context)
+            freqs = [freq for freq in RecurrenceFreq
+                     if freq is not RecurrenceFreq.WEEKDAYS or start_time.weekday() < 5]
+            keyboard = [[InlineKeyboardButton(get_text(lang, 'repeat_none'), callback_data="repeat_none")]]
+            keyboard += [[InlineKeyboardButton(get_text(lang, f'repeat_{freq.value}'), callback_data=f"repeat_{freq.value}")]
+                         for freq in freqs]
+            text = get_text(lang, 'select_repeat')
+        else:
+            keyboard = [[InlineKeyboardButton(get_text(lang, 'repeat_count', count=count),
+                                              callback_data=f"repeat_{parts[1]}_{count}")]
+                        for count in SERIES_COUNT_OPTIONS]
+            keyboard.append([InlineKeyboardButton(get_text(lang, 'repeat_forever'), callback_data=f"repeat_{parts[1]}_0")])
+            text = get_text(lang, 'select_repeat_count')
+        keyboard.append([InlineKeyboardButton(get_text(lang, 'btn_back'), callback_data="repeat_back")])
+        
+        await query.edit_message_text(
+            text,
+            reply_markup=InlineKeyboardMarkup(keyboard),
+            parse_mode='HTML'
+        )
+        
+        return ENTERING_DESCRIPTION
+    
+    @staticmethod
+    def _booking_recurrence(context: ContextTypes.DEFAULT_TYPE):
+        """Правило повторения, выбранное для брони, или None"""
+        repeat = context.user_data.get('booking_repeat')
+        return Recurrence(repeat[0], count=repeat[1]) if repeat else None
+    
+    def _format_recurrence(self, recurrence: Recurrence, lang='ru') -> str:
+        """Описание правила: «каждую неделю, 4 раз»"""
+        rule = get_text(lang, f'repeat_{recurrence.freq.value}')
+        if recurrence.count:
+            rule += ", " + get_text(lang, 'repeat_count', count=recurrence.count)
+        if recurrence.until:
+            rule += ", " + get_text(lang, 'repeat_until', date=recurrence.until.strftime('%d.%m.%Y'))
+        if not recurrence.count and not recurrence.until:
+            rule += ", " + get_text(lang, 'repeat_forever')
+        return rule
+    
+    def _group_chat_id(self) -> int | None:
+        """ID группы для уведомлений из GROUP_CHAT_ID или None"""
         if not GROUP_CHAT_ID:
             logger.info("⚠️ GROUP_CHAT_ID не установлен - уведомления в группу отключены")
-            return  # Если GROUP_CHAT_ID не установлен, не отправляем уведомление
+            return None
 
         # Нормализуем и валидируем GROUP_CHAT_ID
         raw_id = str(GROUP_CHAT_ID).strip()
-        chat_id: int | None = None
         try:
             # Удаляем возможные кавычки
             if raw_id.startswith("\"") and raw_id.endswith("\""):
                 raw_id = raw_id[1:-1]
-            chat_id = int(raw_id)
+            return int(raw_id)
         except Exception:
             logger.error(f"❌ Некорректный GROUP_CHAT_ID: '{GROUP_CHAT_ID}'. Укажите числовой ID группы (например, -1001234567890)")
-            return
+            return None
+    
+    async def send_group_notification(self, context: ContextTypes.DEFAULT_TYPE, user, start_time, end_time, description,
+                                      room_name=None, recurrence=None):
+        """Отправить уведомление о новой брони в группу"""
+        chat_id = self._group_chat_id()
+        if chat_id is None:
+            return  # Если GROUP_CHAT_ID не установлен, не отправляем уведомление
         
         try:
             # Форматируем сообщение для группы (двуязычное)
@@ -442,6 +617,11 @@ class MeetingRoomBot:
                 f"⏰ <b>Время / Saat:</b> {start_time.strftime('%H:%M')} - {end_time.strftime('%H:%M')}\n"
                 f"📝 <b>Описание / Təsvir:</b> {description}\n"
             )
+            if room_name:
+                message += f"🚪 <b>Комната / Otaq:</b> {room_name}\n"
+            if recurrence is not None:
+                message += (f"🔁 <b>Повтор / Təkrar:</b> {self._format_recurrence(recurrence, 'ru')} / "
+                            f"{self._format_recurrence(recurrence, 'az')}\n")
             
             logger.info(f"📤 Отправка уведомления в группу {chat_id}...")
             await context.bot.send_message(
@@ -455,56 +635,93 @@ class MeetingRoomBot:
             logger.error(f"GROUP_CHAT_ID: {GROUP_CHAT_ID}")
     
 
+    async def send_reminders(self, context: ContextTypes.DEFAULT_TYPE):
+        """Задача JobQueue: разослать наступившие напоминания с учетом лимитов Telegram"""
+        # Раз в сутки ставим в очередь вхождения серий, вошедшие в окно напоминаний
+        now = now_baku()
+        if self._reminders_extended_on != now.date():
+            self._reminders_extended_on = now.date()
+            self.reminders.extend(await self.db.get_upcoming_bookings(ReminderQueue.LOOKAHEAD_DAYS), now)
+        
+        due = self.reminders.pop_due(now)
+        if due:
+            for booking in due:
+                lang = await self.db.get_user_language(booking.user_id) or 'ru'
+                self.outbox.put(booking.user_id, get_text(
+                    lang, 'reminder',
+                    minutes=REMINDER_MINUTES_BEFORE,
+                    date=self._format_date(booking.start.date(), lang),
+                    start_time=booking.start.strftime('%H:%M'),
+                    end_time=booking.end.strftime('%H:%M'),
+                    description=booking.description
+                ))
+            
+            # В группу - одно сообщение на все встречи, начинающиеся одновременно
+            group_id = self._group_chat_id() if GROUP_CHAT_ID else None
+            if group_id is not None:
+                lines = [
+                    f"⏰ {b.start.strftime('%H:%M')} - {b.end.strftime('%H:%M')} "
+                    f"{f'🚪 {b.room_name} ' if len(ROOMS) > 1 else ''}👤 {b.user_name}: {b.description}"
+                    for b in sorted(due, key=lambda b: b.start)
+                ]
+                self.outbox.put(group_id, (
+                    "🔔 <b>Скоро встреча</b> / <b>Görüş yaxınlaşır</b>\n\n" + "\n".join(lines)
+                ))
+        
+        if len(self.outbox):
+            await self.outbox.flush(context.bot)
+    
     async def confirm_booking(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Подтверждение и создание брони"""
         description = update.message.text
         user = update.effective_user
-        lang = self.db.get_user_language(user.id)
+        lang = await self.db.get_user_language(user.id)
         
         # Получаем данные бронирования
-        date_str = context.user_data['booking_date']
-        time_str = context.user_data['booking_time']
-        duration = context.user_data['booking_duration']
-        
-        start_time = datetime.fromisoformat(f"{date_str}T{time_str}")
-        end_time = start_time + timedelta(minutes=duration)
+        start_time, end_time = self._booking_interval(context)
+        recurrence = self._booking_recurrence(context)
         
-        # Проверяем, не занято ли время
-        if not self._check_availability(start_time, end_time):
-            keyboard = [[InlineKeyboardButton(get_text(lang, 'btn_back_to_menu'), callback_data="back_to_menu")]]
-            await update.message.reply_text(
-                get_text(lang, 'time_already_booked'),
-                reply_markup=InlineKeyboardMarkup(keyboard)
-            )
-            return ConversationHandler.END
-        
-        # Создаем бронирование
-        success = self.db.create_booking(
+        # Проверка пересечения, выбор комнаты, выдача ID и сохранение - одна атомарная операция
+        result = await self.db.try_create_booking(
             user_id=user.id,
             user_name=user.full_name,
             start_time=start_time.isoformat(),
             end_time=end_time.isoformat(),
-            description=description
+            description=description,
+            room_id=context.user_data.get('booking_room', DEFAULT_ROOM),
+            recurrence=recurrence
         )
         
-        if success:
+        if result.status == BookingResult.CONFLICT:
+            await update.message.reply_text(
+                get_text(lang, 'time_already_booked'),
+                reply_markup=back_to_menu_keyboard(lang, 'btn_back_to_menu')
+            )
+            return ConversationHandler.END
+        
+        if result.created:
+            # Название комнаты показываем, только если комнат несколько
+            room_name = result.booking.room_name if len(ROOMS) > 1 else None
+            
             # Отправляем уведомление в группу
-            await self.send_group_notification(context, user, start_time, end_time, description)
+            await self.send_group_notification(context, user, start_time, end_time, description, room_name, recurrence)
             
-            keyboard = [
-                [InlineKeyboardButton(get_text(lang, 'btn_my_bookings'), callback_data="my_bookings")],
-                [InlineKeyboardButton(get_text(lang, 'btn_main_menu'), callback_data="back_to_menu")]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            reply_markup = booking_done_keyboard(lang)
+            
+            text = get_text(
+                lang, 'booking_success',
+                date=self._format_date(start_time.date(), lang),
+                start_time=start_time.strftime('%H:%M'),
+                end_time=end_time.strftime('%H:%M'),
+                description=description
+            )
+            if room_name:
+                text += "\n" + get_text(lang, 'room_label', room=room_name)
+            if recurrence is not None:
+                text += "\n" + get_text(lang, 'repeat_label', rule=self._format_recurrence(recurrence, lang))
             
             await update.message.reply_text(
-                get_text(
-                    lang, 'booking_success',
-                    date=self._format_date(start_time.date(), lang),
-                    start_time=start_time.strftime('%H:%M'),
-                    end_time=end_time.strftime('%H:%M'),
-                    description=description
-                ),
+                text,
                 reply_markup=reply_markup,
                 parse_mode='HTML'
             )
@@ -517,45 +734,83 @@ class MeetingRoomBot:
         context.user_data.clear()
         return ConversationHandler.END
     
-    async def my_bookings(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Показать брони пользователя"""
+    async def my_bookings(self, update: Update, context: ContextTypes.DEFAULT_TYPE, answered: bool = False):
+        """Показать брони пользователя (answered - на нажатие уже ответили, например alert)"""
         query = update.callback_query
-        await query.answer()
+        if not answered:
+            await query.answer()
         
         user = update.effective_user
-        lang = self.db.get_user_language(user.id)
+        lang = await self.db.get_user_language(user.id)
         user_id = user.id
         chat_type = update.effective_chat.type
-        bookings = self.db.get_user_bookings(user_id)
+        
+        # my_bookings_next_<курсор> / my_bookings_prev_<курсор> - листание страниц
+        cursor, before = None, False
+        if query.data.startswith(('my_bookings_next_', 'my_bookings_prev_')):
+            _, _, direction, token = query.data.split('_', 3)
+            cursor, before = self._decode_cursor(token), direction == 'prev'
+        
+        page = await self.db.get_user_bookings_page(user_id, cursor, before=before)
+        if not page.bookings and cursor is not None:
+            # Брони страницы успели отменить - показываем первую
+            cursor = None
+            page = await self.db.get_user_bookings_page(user_id)
+        bookings = page.bookings
         
         if not bookings:
             text = get_text(lang, 'my_bookings_empty')
-            keyboard = [[InlineKeyboardButton(get_text(lang, 'btn_back'), callback_data="back_to_menu")]]
+            reply_markup = back_to_menu_keyboard(lang)
         else:
             text = get_text(lang, 'my_bookings_title')
             keyboard = []
+            now = now_baku()
             
             for booking in bookings:
-                start = datetime.fromisoformat(booking['start_time'])
-                end = datetime.fromisoformat(booking['end_time'])
+                # Для серии показываем ближайшее вхождение и правило
+                occurrence = booking.next_occurrence(now) if booking.is_series else booking
+                shown = occurrence or booking
+                start = shown.start
+                end = shown.end
                 
                 text += (
                     f"📅 {self._format_date(start.date(), lang)}\n"
                     f"⏰ {start.strftime('%H:%M')} - {end.strftime('%H:%M')}\n"
-                    f"📝 {booking['description']}\n\n"
+                    + (f"🚪 {booking.room_name}\n" if len(ROOMS) > 1 else '')
+                    + (get_text(lang, 'repeat_label', rule=self._format_recurrence(booking.recurrence, lang)) + "\n"
+                       if booking.is_series else '') +
+                    f"📝 {booking.description}\n\n"
                 )
                 
+                if booking.is_series:
+                    if occurrence is not None:
+                        keyboard.append([InlineKeyboardButton(
+                            get_text(lang, 'btn_cancel_booking', time=start.strftime('%d.%m %H:%M')),
+                            callback_data=f"skip_{booking.id}_{start.date().isoformat()}"
+                        )])
+                    keyboard.append([InlineKeyboardButton(
+                        get_text(lang, 'btn_cancel_series'),
+                        callback_data=f"cancel_{booking.id}"
+                    )])
+                    continue
+                
                 keyboard.append([InlineKeyboardButton(
                     get_text(lang, 'btn_cancel_booking', time=start.strftime('%d.%m %H:%M')),
-                    callback_data=f"cancel_{booking['id']}"
+                    callback_data=f"cancel_{booking.id}"
                 )])
             
+            nav_row = page_nav_row(
+                lang,
+                prev_data=f"my_bookings_prev_{self._encode_cursor(page.first_key)}" if page.has_prev else None,
+                next_data=f"my_bookings_next_{self._encode_cursor(page.last_key)}" if page.has_next else None,
+            )
+            if nav_row:
+                keyboard.append(nav_row)
             keyboard.append([InlineKeyboardButton(get_text(lang, 'btn_back'), callback_data="back_to_menu")])
+            reply_markup = InlineKeyboardMarkup(keyboard)
         
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        # В группе отправляем новое сообщение, а не редактируем
-        if chat_type in ['group', 'supergroup']:
+        # В группе отправляем новое сообщение, а не редактируем (кроме листания)
+        if chat_type in ['group', 'supergroup'] and cursor is None:
             await query.message.reply_text(
                 text,
                 reply_markup=reply_markup,
@@ -575,15 +830,15 @@ class MeetingRoomBot:
         await query.answer()
         
         user = update.effective_user
-        lang = self.db.get_user_language(user.id)
+        lang = await self.db.get_user_language(user.id)
         booking_id = int(query.data.split('_')[1])
         user_id = user.id
         
         # Проверяем, принадлежит ли бронь пользователю
-        booking = self.db.get_booking(booking_id)
+        booking = await self.db.get_booking(booking_id)
         
-        if booking and booking['user_id'] == user_id:
-            success = self.db.cancel_booking(booking_id, user_id)
+        if booking and booking.user_id == user_id:
+            success = await self.db.cancel_booking(booking_id, user_id)
             if success:
                 await query.answer(get_text(lang, 'booking_cancelled'), show_alert=True)
             else:
@@ -594,28 +849,46 @@ class MeetingRoomBot:
         # Обновляем список броней
         await self.my_bookings(update, context)
     
+    async def cancel_occurrence(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Отменить одно вхождение серии (серия продолжается)"""
+        query = update.callback_query
+        
+        user = update.effective_user
+        lang = await self.db.get_user_language(user.id)
+        
+        # skip_<ID серии>_<YYYY-MM-DD>
+        _, series_id, day = query.data.split('_')
+        day = datetime.fromisoformat(day).date()
+        
+        # На нажатие отвечаем один раз - alert с результатом (повторный ответ Telegram отклоняет)
+        if await self.db.cancel_occurrence(int(series_id), day, user.id):
+            await query.answer(get_text(lang, 'occurrence_cancelled', date=day.strftime('%d.%m')), show_alert=True)
+        else:
+            await query.answer(get_text(lang, 'cancel_error'), show_alert=True)
+        
+        # Обновляем список броней
+        await self.my_bookings(update, context, answered=True)
+    
     async def show_help(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Показать справку"""
         query = update.callback_query
         await query.answer()
         
         user = update.effective_user
-        lang = self.db.get_user_language(user.id)
+        lang = await self.db.get_user_language(user.id)
         
         help_text = (
             get_text(lang, 'help_title') +
             get_text(lang, 'help_view') +
             get_text(lang, 'help_create') +
+            get_text(lang, 'help_next') +
             get_text(lang, 'help_my') +
             get_text(lang, 'help_rules')
         )
         
-        keyboard = [[InlineKeyboardButton(get_text(lang, 'btn_back'), callback_data="back_to_menu")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
         await query.edit_message_text(
             help_text,
-            reply_markup=reply_markup,
+            reply_markup=back_to_menu_keyboard(lang),
             parse_mode='HTML'
         )
 
@@ -722,37 +995,121 @@ class MeetingRoomBot:
                 
                 await update.message.reply_text(text, reply_markup=reply_markup)
     
+    @staticmethod
+    def _encode_cursor(key) -> str:
+        """Курсор страницы (время начала, ID) для callback_data"""
+        start, booking_id = key
+        return f"{start.strftime('%Y%m%d%H%M%S')}-{booking_id}"
+    
+    @staticmethod
+    def _decode_cursor(token: str):
+        """Разобрать курсор из callback_data"""
+        start, booking_id = token.split('-')
+        return datetime.strptime(start, '%Y%m%d%H%M%S'), int(booking_id)
+    
     def _format_date(self, date, lang='ru'):
         """Форматирование даты"""
         weekday_str = get_weekday(lang, date.weekday())
         month_str = get_month(lang, date.month)
         
         return f"{weekday_str}, {date.day} {month_str}"
+
+
+# Какие типы обновлений разбирает каждый вид обработчика
+HANDLER_UPDATE_TYPES = {
+    CommandHandler: [Update.MESSAGE],
+    MessageHandler: [Update.MESSAGE],
+    CallbackQueryHandler: [Update.CALLBACK_QUERY],
+}
+
+
+def allowed_update_types(application: Application) -> list:
+    """Типы обновлений для Telegram - только те, что разбирают зарегистрированные обработчики"""
+    handlers = [handler for group in application.handlers.values() for handler in group]
+    types = set()
+    while handlers:
+        handler: BaseHandler = handlers.pop()
+        if isinstance(handler, ConversationHandler):
+            handlers.extend(handler.entry_points)
+            handlers.extend(handler.fallbacks)
+            handlers.extend(h for state in handler.states.values() for h in state)
+            continue
+        known = HANDLER_UPDATE_TYPES.get(type(handler))
+        if known is None:
+            # Неизвестный обработчик - не рискуем потерять его обновления
+            logger.warning(f"⚠️ Обработчик {type(handler).__name__} без списка обновлений - подписываемся на все")
+            return Update.ALL_TYPES
+        types.update(known)
+    # Порядок как в Update.ALL_TYPES, чтобы список был стабильным
+    return [update_type for update_type in Update.ALL_TYPES if update_type in types]
+
+
+def run_webhook(application: Application, allowed_updates: list):
+    """Запуск в режиме вебхука: встроенный HTTP-сервер PTB + регистрация адреса в Telegram"""
+    secret_token = WEBHOOK_SECRET_TOKEN
+    if not secret_token:
+        secret_token = secrets.token_urlsafe(32)
+        logger.warning("⚠️ WEBHOOK_SECRET_TOKEN не задан - используется случайный секрет на этот запуск")
+    if WEBHOOK_LOCAL:
+        asyncio.get_event_loop().run_until_complete(serve_local_webhook(application, secret_token))
+        return
+    if not WEBHOOK_URL:
+        raise ValueError("BOT_MODE=webhook требует WEBHOOK_URL (публичный HTTPS-адрес бота)")
+    webhook_url = f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH.strip('/')}"
+    logger.info(f"🌐 Вебхук: {webhook_url}, сервер {WEBHOOK_LISTEN}:{WEBHOOK_PORT}")
+    # Запросы без правильного заголовка X-Telegram-Bot-Api-Secret-Token сервер отклоняет (403)
+    application.run_webhook(
+        listen=WEBHOOK_LISTEN,
+        port=WEBHOOK_PORT,
+        url_path=WEBHOOK_PATH.strip('/'),
+        webhook_url=webhook_url,
+        secret_token=secret_token,
+        allowed_updates=allowed_updates,
+    )
+
+
+async def serve_local_webhook(application: Application, secret_token: str):
+    """Локальный сервер вебхука: принимает обновления POST-запросами, но не регистрирует адрес в Telegram
     
-    def _is_time_available(self, time_obj, bookings):
-        """Проверка доступности времени"""
-        for booking in bookings:
-            start = datetime.fromisoformat(booking['start_time'])
-            end = datetime.fromisoformat(booking['end_time'])
-            
-            if start <= time_obj < end:
-                return False
-        
-        return True
+    run_webhook из PTB при старте всегда вызывает setWebhook, поэтому для
+    локальной проверки сервер поднимается отдельно (tornado из
+    python-telegram-bot[webhooks]); проверка секрета та же.
+    """
+    from tornado.httpserver import HTTPServer
+    from tornado.web import Application as WebApplication, RequestHandler
     
-    def _check_availability(self, start_time, end_time):
-        """Проверка доступности временного слота"""
-        bookings = self.db.get_bookings_by_date(start_time.date().isoformat())
-        
-        for booking in bookings:
-            booking_start = datetime.fromisoformat(booking['start_time'])
-            booking_end = datetime.fromisoformat(booking['end_time'])
-            
-            # Проверяем пересечение временных интервалов
-            if (start_time < booking_end and end_time > booking_start):
-                return False
-        
-        return True
+    class UpdateHandler(RequestHandler):
+        async def post(self):
+            received = self.request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+            if not hmac.compare_digest(received, secret_token):
+                self.send_error(403)
+                return
+            try:
+                update = Update.de_json(json.loads(self.request.body), application.bot)
+            except (ValueError, TypeError, KeyError) as e:
+                logger.warning(f"⚠️ Некорректное обновление в локальном вебхуке: {e}")
+                self.send_error(400)
+                return
+            await application.update_queue.put(update)
+    
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass  # Windows: остановка по Ctrl+C через KeyboardInterrupt
+    
+    async with application:
+        await application.start()
+        server = HTTPServer(WebApplication([(rf"/{WEBHOOK_PATH.strip('/')}/?", UpdateHandler)]))
+        server.listen(WEBHOOK_PORT, address=WEBHOOK_LISTEN)
+        logger.info(f"🧪 Локальный вебхук (без setWebhook): http://{WEBHOOK_LISTEN}:{WEBHOOK_PORT}/{WEBHOOK_PATH.strip('/')}")
+        try:
+            await stop.wait()
+        finally:
+            server.stop()
+            await application.stop()
 
 
 def main():
@@ -765,39 +1122,68 @@ def main():
         logger.info("Проверка конфигурации...")
         logger.info(f"BOT_TOKEN установлен: {bool(BOT_TOKEN)}")
         logger.info(f"GROUP_CHAT_ID: {GROUP_CHAT_ID if GROUP_CHAT_ID else '(не установлен, уведомления отключены)'}")
+        logger.info(f"Режим получения обновлений: {BOT_MODE}")
+        if BOT_MODE not in ('polling', 'webhook'):
+            raise ValueError(f"Неизвестный BOT_MODE: {BOT_MODE} (ожидается polling или webhook)")
         
         # Создаем приложение
         logger.info("Создание приложения Telegram...")
-        application = Application.builder().token(BOT_TOKEN).build()
+        # Обновления разных пользователей - параллельно, одного пользователя - по очереди
+        application = Application.builder().token(BOT_TOKEN).concurrent_updates(PerUserUpdateProcessor()).build()
+        
+        # Прошедшие брони - в архив, в памяти остаются только актуальные
+        db.archive_past_bookings()
         
-        bot = MeetingRoomBot()
+        bot = MeetingRoomBot(db)
         logger.info("✅ Бот инициализирован успешно")
         
+        # Фоновое обслуживание и напоминания (нужен python-telegram-bot[job-queue])
+        if application.job_queue is not None:
+            Maintenance(db).schedule(application.job_queue)
+            application.job_queue.run_repeating(bot.send_reminders, interval=REMINDER_TICK_SECONDS,
+                                                first=REMINDER_TICK_SECONDS, name="reminders")
+        else:
+            logger.warning("⚠️ JobQueue недоступна - обслуживание хранилища и напоминания отключены")
+        
         # Обработчик процесса бронирования
         booking_handler = ConversationHandler(
-            entry_points=[CallbackQueryHandler(bot.start_booking, pattern="^create_booking$")],
+            entry_points=[
+                CallbackQueryHandler(bot.start_booking, pattern="^create_booking$"),
+                CallbackQueryHandler(bot.book_window, pattern="^window_"),
+            ],
             states={
                 SELECTING_DATE: [CallbackQueryHandler(bot.select_time, pattern="^date_")],
                 SELECTING_TIME: [CallbackQueryHandler(bot.select_duration, pattern="^time_|^occupied$")],
-                ENTERING_DURATION: [CallbackQueryHandler(bot.enter_description, pattern="^duration_")],
-                ENTERING_DESCRIPTION: [MessageHandler(filters.TEXT & ~filters.COMMAND, bot.confirm_booking)],
+                ENTERING_DURATION: [CallbackQueryHandler(bot.select_room, pattern="^duration_")],
+                SELECTING_ROOM: [
+                    CallbackQueryHandler(bot.enter_description, pattern="^room_"),
+                    CallbackQueryHandler(bot.select_time, pattern="^date_"),
+                ],
+                ENTERING_DESCRIPTION: [
+                    MessageHandler(filters.TEXT & ~filters.COMMAND, bot.confirm_booking),
+                    CallbackQueryHandler(bot.select_repeat, pattern="^repeat"),
+                ],
             },
             fallbacks=[
                 CallbackQueryHandler(bot.main_menu, pattern="^back_to_menu$"),
-                CallbackQueryHandler(bot.start_booking, pattern="^create_booking$")
+                CallbackQueryHandler(bot.start_booking, pattern="^create_booking$"),
+                CallbackQueryHandler(bot.book_window, pattern="^window_"),
             ],
         )
         
         # Добавляем обработчики
         application.add_handler(CommandHandler("start", bot.start))
         application.add_handler(CommandHandler("chatid", bot.chat_id))
+        application.add_handler(CommandHandler("next", bot.next_free))
         application.add_handler(CallbackQueryHandler(bot.select_language, pattern="^lang_"))
         application.add_handler(CallbackQueryHandler(bot.change_language, pattern="^change_language$"))
         application.add_handler(booking_handler)
         application.add_handler(CallbackQueryHandler(bot.main_menu, pattern="^back_to_menu$"))
-        application.add_handler(CallbackQueryHandler(bot.view_bookings, pattern="^view_bookings$"))
-        application.add_handler(CallbackQueryHandler(bot.my_bookings, pattern="^my_bookings$"))
+        application.add_handler(CallbackQueryHandler(bot.view_bookings, pattern="^view_bookings(_[0-9-]+)?$"))
+        application.add_handler(CallbackQueryHandler(bot.my_bookings, pattern="^my_bookings(_(next|prev)_.+)?$"))
         application.add_handler(CallbackQueryHandler(bot.cancel_booking, pattern="^cancel_"))
+        application.add_handler(CallbackQueryHandler(bot.cancel_occurrence, pattern="^skip_"))
+        application.add_handler(CallbackQueryHandler(bot.next_free, pattern="^next_free(_[0-9]+)?$"))
         application.add_handler(CallbackQueryHandler(bot.show_help, pattern="^help$"))
         
         # Запускаем бота
@@ -805,7 +1191,14 @@ def main():
         logger.info("=" * 50)
         logger.info("✅ БОТ ГОТОВ И РАБОТАЕТ")
         logger.info("=" * 50)
-        application.run_polling(allowed_updates=Update.ALL_TYPES)
+        allowed_updates = allowed_update_types(application)
+        logger.info(f"📬 Типы обновлений: {', '.join(allowed_updates)}")
+        if BOT_MODE == 'webhook':
+            run_webhook(application, allowed_updates)
+        else:
+            application.run_polling(allowed_updates=allowed_updates)
+        bot.db.close()
+        db.close()
         
     except Exception as e:
         logger.error(f"❌ КРИТИЧЕСКАЯ ОШИБКА: {e}", exc_info=True)
@@ -813,6 +1206,5 @@ def main():
 
 
 if __name__ == "__main__":
-    import asyncio
     asyncio.set_event_loop(asyncio.new_event_loop())
     main()
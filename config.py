@@ -11,9 +11,60 @@ load_dotenv()
 # Токен бота (получите у @BotFather в Telegram)
 BOT_TOKEN = os.getenv("BOT_TOKEN", "YOUR_BOT_TOKEN_HERE")
 
-# Настройки базы данных
-# DATABASE_URL = os.getenv("DATABASE_URL")  # Больше не нужна - используем JSON
-DATABASE_NAME = "meeting_room.db"  # Больше не используется
+# Режим получения обновлений: polling (по умолчанию) - бот сам опрашивает Telegram,
+# webhook - Telegram присылает обновления POST-запросами на встроенный HTTP-сервер
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+
+# Вебхук: публичный HTTPS-адрес (без пути), путь, адрес/порт HTTP-сервера и секрет,
+# который Telegram передает в заголовке X-Telegram-Bot-Api-Secret-Token.
+# Без WEBHOOK_SECRET_TOKEN при каждом запуске генерируется случайный секрет
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram")
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", os.getenv("PORT", "8443")))
+WEBHOOK_SECRET_TOKEN = os.getenv("WEBHOOK_SECRET_TOKEN")
+# Локальная проверка: HTTP-сервер вебхука без регистрации адреса в Telegram (setWebhook не вызывается,
+# WEBHOOK_URL не нужен) - обновления отправляются на него вручную, например curl
+WEBHOOK_LOCAL = os.getenv("WEBHOOK_LOCAL", "0") == "1"
+
+# Параллельная обработка обновлений: сколько обновлений выполняется одновременно
+# (обновления одного пользователя - всегда по очереди) и сколько может ждать своей очереди
+UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", "16"))
+UPDATE_QUEUE_LIMIT = 1024
+
+# Бэкенд хранения бронирований:
+#   json    - bookings.json, переписывается целиком при каждом изменении
+#   journal - снимок + журнал с дозаписью (данные из bookings.json переносятся автоматически)
+#   sqlite  - SQLite в режиме WAL (данные из bookings.json переносятся автоматически)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "json")
+
+# Файл базы SQLite (в каталоге data/, используется при STORAGE_BACKEND=sqlite)
+DATABASE_NAME = "meeting_room.db"
+
+# Надежная запись: fsync каталога после rename / fsync журнала / synchronous=FULL в SQLite.
+# Сама запись атомарна всегда (временный файл + rename), флаг защищает еще и от потери питания
+DURABLE_WRITES = os.getenv("DURABLE_WRITES", "1") == "1"
+
+# Через сколько записей журнал сворачивается в снимок
+JOURNAL_COMPACT_EVERY = 500
+
+# Окно групповой записи (мс): изменения, пришедшие за это время, пишутся на диск одной записью.
+# Ответ пользователю отправляется только после записи; 0 - писать сразу
+WRITE_BATCH_WINDOW_MS = int(os.getenv("WRITE_BATCH_WINDOW_MS", "50"))
+
+# Количество потоков для операций с хранилищем (обработчики бота не блокируют event loop).
+# Потоки ждут групповой записи, поэтому их число ограничивает размер пачки
+DB_EXECUTOR_WORKERS = 8
+
+# Сколько профилей пользователей держать в памяти (LRU)
+USER_CACHE_SIZE = 10000
+
+# Переговорные комнаты: "id=Название;id2=Название 2" (переменная окружения ROOMS).
+# Брони без комнаты (созданные до появления нескольких комнат) относятся к первой
+ROOMS = dict(
+    item.split('=', 1) for item in os.getenv("ROOMS", "main=Переговорная").split(';') if '=' in item
+) or {"main": "Переговорная"}
+DEFAULT_ROOM = next(iter(ROOMS))
 
 # Настройки времени работы комнаты
 ROOM_OPEN_HOUR = 8  # Комната открывается в 08:00
@@ -25,12 +76,38 @@ BOOKING_DURATIONS = [30, 60, 90, 120, 180]
 # Максимальное количество дней для бронирования вперед
 MAX_BOOKING_DAYS = 7
 
+# Сколько ближайших свободных окон показывает /next
+NEXT_FREE_WINDOWS = 5
+
+# Варианты числа повторений серии при бронировании (плюс «без окончания»)
+SERIES_COUNT_OPTIONS = [4, 8, 12]
+
+# Пагинация: броней на странице «Мои брони» и предел длины страницы сводки
+# (лимит Telegram - 4096 символов на сообщение)
+BOOKINGS_PAGE_SIZE = 5
+DIGEST_PAGE_CHARS = 3500
+
 # Временные слоты (интервал между доступными временами)
 TIME_SLOT_INTERVAL = 30  # минут
 
 # Автоматическая очистка старых бронирований (дни)
 AUTO_CLEANUP_DAYS = 30
 
+# Фоновое обслуживание (очистка, архив, проверка индексов, свертка журналов).
+# Запускается ежедневно в MAINTENANCE_HOUR по времени Баку и идет шагами:
+# каждые MAINTENANCE_TICK_SECONDS не дольше MAINTENANCE_TICK_BUDGET_MS
+MAINTENANCE_HOUR = int(os.getenv("MAINTENANCE_HOUR", "3"))
+MAINTENANCE_TICK_SECONDS = 1
+MAINTENANCE_TICK_BUDGET_MS = 50
+
+# Напоминания о встречах: за сколько минут до начала, как часто проверять очередь (с)
+# и лимиты отправки (Telegram: ~30 сообщений/с всего, 1/с в чат, 20/мин в группу)
+REMINDER_MINUTES_BEFORE = int(os.getenv("REMINDER_MINUTES_BEFORE", "10"))
+REMINDER_TICK_SECONDS = 1
+REMINDER_GLOBAL_RATE = 25
+REMINDER_CHAT_INTERVAL = 1.0
+REMINDER_GROUP_INTERVAL = 3.0
+
 # ID группы для уведомлений о бронировании (получите у @userinfobot в группе)
 # Формат: -100123456789 (со знаком минус, если ID больше)
 GROUP_CHAT_ID = os.getenv("GROUP_CHAT_ID")  # Опционально, если есть - будут уведомления в группу
@@ -3,230 +3,952 @@
 Управление бронированиями переговорной комнаты
 """
 
-import json
+import asyncio
+import functools
 import os
 import logging
-from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta, timezone
 
 BAKU_TZ = timezone(timedelta(hours=4))
 
 def now_baku():
     return datetime.now(BAKU_TZ).replace(tzinfo=None)
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 import threading
+from bisect import bisect_left, bisect_right, insort
+
+from archive import BookingArchive
+from availability import DAY_GRID, RoomOccupancy, booking_days
+from config import (
+    STORAGE_BACKEND, DB_EXECUTOR_WORKERS, DURABLE_WRITES, WRITE_BATCH_WINDOW_MS,
+    JOURNAL_COMPACT_EVERY, USER_CACHE_SIZE, BOOKINGS_PAGE_SIZE, ROOMS, DEFAULT_ROOM,
+    MAX_BOOKING_DAYS, NEXT_FREE_WINDOWS,
+)
+from models import Booking, BookingStatus, Recurrence
+from storage import GroupCommitter, create_storage, write_json_file
+from users import UserStore
 
 logger = logging.getLogger(__name__)
 
 
+@dataclass
+class BookingResult:
+    """Результат попытки создать бронь"""
+    
+    CREATED = 'created'
+    CONFLICT = 'conflict'
+    ERROR = 'error'
+    
+    status: str
+    booking: Optional[Booking] = None    # созданная бронь (status == CREATED)
+    conflict: Optional[Booking] = None   # пересекающаяся бронь (status == CONFLICT)
+    error: Optional[str] = None       # текст ошибки (status == ERROR)
+    
+    @property
+    def created(self) -> bool:
+        return self.status == self.CREATED
+
+
+@dataclass
+class FreeWindow:
+    """Свободное окно для брони: начало, конец и комната"""
+    
+    start: datetime
+    end: datetime
+    room_id: str
+
+
+@dataclass
+class BookingPage:
+    """Страница броней, выбранная по ключу (время начала, ID)"""
+    
+    bookings: List[Booking]
+    has_prev: bool = False
+    has_next: bool = False
+    
+    @property
+    def first_key(self) -> Optional[Tuple[datetime, int]]:
+        """Курсор для перехода на предыдущую страницу"""
+        return (self.bookings[0].start, self.bookings[0].id) if self.bookings else None
+    
+    @property
+    def last_key(self) -> Optional[Tuple[datetime, int]]:
+        """Курсор для перехода на следующую страницу"""
+        return (self.bookings[-1].start, self.bookings[-1].id) if self.bookings else None
+
+
 class Database:
-    """Класс для работы с данными бронирований через JSON файлы"""
+    """Класс для работы с данными бронирований
+    
+    Брони загружаются в память один раз при старте (как записи Booking)
+    и отдаются из памяти копиями;
+    create/cancel/cleanup сразу записывают изменения через бэкенд хранения
+    (см. storage.py).
+    """
     
-    def __init__(self, data_dir: str = "data"):
+    def __init__(self, data_dir: str = "data", backend: str = STORAGE_BACKEND):
         """Инициализация хранилища"""
         self.data_dir = data_dir
-        self.bookings_file = os.path.join(data_dir, "bookings.json")
-        self.users_file = os.path.join(data_dir, "users.json")
-        self.booking_id_file = os.path.join(data_dir, "booking_id.json")
-        self.lock = threading.Lock()  # Для безопасного доступа из разных потоков
+        # Профили пользователей: LRU-кэш + журнал изменений (см. users.py)
+        self.users = UserStore(data_dir, max_size=USER_CACHE_SIZE,
+                               compact_every=JOURNAL_COMPACT_EVERY, durable=DURABLE_WRITES)
+        self.backend = backend
+        self.storage = create_storage(backend, data_dir)
+        # Прошедшие брони - в помесячных сжатых партициях (см. archive.py)
+        self.archive = BookingArchive(data_dir, durable=DURABLE_WRITES)
+        # RLock: откаты групповой записи выполняются под этой же блокировкой
+        self.lock = threading.RLock()  # Для безопасного доступа из разных потоков
+        
+        # Кэш бронирований в памяти: читается один раз при старте,
+        # изменения записываются на диск до ответа вызывающему (write-through)
+        self._bookings: List[Booking] = []
+        self._next_id = 1
+        # Занятость по комнатам: интервалы активных броней и битовые карты слотов по дням
+        self._rooms: Dict[str, RoomOccupancy] = {room_id: RoomOccupancy() for room_id in ROOMS}
+        # Вторичные индексы: ID -> бронь, user_id -> активные брони по времени начала
+        self._by_id: Dict[int, Booking] = {}
+        self._by_user: Dict[int, List[Booking]] = {}
+        # Серии: правило хранится одной записью, вхождения раскрываются лениво -
+        # только для запрошенных дат - и кэшируются по серии и дню
+        self._series: Dict[int, Booking] = {}
+        self._occurrences: Dict[int, Dict[date, Booking]] = {}
+        self._expanded: Optional[Tuple[date, date]] = None  # раскрытое окно дат [с, по]
+        # Версии дней для кэша отрисовки: меняются при создании/отмене брони, начинающейся в этот день
+        self._day_versions: Dict = {}
+        self._version_counter = 0
+        # Подписчики на создание/отмену броней (напоминания и т.п.)
+        self._listeners: List = []
         
         # Создаем директорию если её нет
         os.makedirs(data_dir, exist_ok=True)
         
-        logger.info("📁 JSON режим: хранение данных в файлах")
+        logger.info(f"📁 Режим хранения: {backend}")
         self.init_db()
+        self._load_bookings()
+        
+        # Все изменения пишутся через групповую фиксацию
+        self._committer = GroupCommitter(self.storage, self._snapshot, self.lock,
+                                         window_ms=WRITE_BATCH_WINDOW_MS)
     
     def init_db(self):
         """Инициализация файлов данных"""
         try:
             # Инициализируем файлы если их нет
-            if not os.path.exists(self.bookings_file):
-                self._write_json(self.bookings_file, [])
-                logger.info(f"✅ Создан файл бронирований: {self.bookings_file}")
+            self.storage.init()
             
-            if not os.path.exists(self.users_file):
-                self._write_json(self.users_file, {})
-                logger.info(f"✅ Создан файл пользователей: {self.users_file}")
-            
-            if not os.path.exists(self.booking_id_file):
-                self._write_json(self.booking_id_file, {"next_id": 1})
-                logger.info(f"✅ Создан счетчик ID: {self.booking_id_file}")
+            self.users.init()
             
             logger.info("✅ Инициализация завершена успешно")
         except Exception as e:
             logger.error(f"❌ Ошибка инициализации: {e}")
             raise
     
-    def _read_json(self, filepath: str):
-        """Читать JSON файл потокобезопасно"""
+    def _load_bookings(self):
+        """Загрузить брони с диска в память (один раз при старте)"""
         with self.lock:
-            try:
-                if os.path.exists(filepath):
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        return json.load(f)
-                return {} if 'users' in filepath else []
-            except Exception as e:
-                logger.error(f"Ошибка чтения {filepath}: {e}")
-                return {} if 'users' in filepath else []
+            records, self._next_id = self.storage.load()
+            # ISO-строки разбираются один раз здесь, дальше работаем с Booking
+            self._bookings = [Booking.from_dict(record) for record in records]
+            self._rebuild_indexes()
+        logger.info(f"📥 Загружено бронирований в память: {len(self._bookings)}")
     
-    def _write_json(self, filepath: str, data):
-        """Писать JSON файл потокобезопасно"""
+    def _snapshot(self):
+        """Копия состояния (при старте - начальное подтвержденное состояние GroupCommitter)"""
         with self.lock:
+            return [b.to_dict() for b in self._bookings], self._next_id
+    
+    def close(self):
+        """Дописать ожидающие изменения и закрыть хранилище"""
+        self._committer.close()
+        self.storage.close()
+    
+    def add_listener(self, listener):
+        """Подписаться на события броней: listener('created' | 'cancelled' | 'skipped', бронь)
+        
+        Вызывается в потоке операции после того, как изменение записано на диск.
+        Для серии 'created'/'cancelled' получают запись серии, 'skipped' -
+        отмененное вхождение.
+        """
+        self._listeners.append(listener)
+    
+    def _notify(self, event: str, booking: Booking):
+        for listener in self._listeners:
             try:
-                os.makedirs(os.path.dirname(filepath), exist_ok=True)
-                with open(filepath, 'w', encoding='utf-8') as f:
-                    json.dump(data, f, ensure_ascii=False, indent=2)
+                listener(event, booking.copy())
             except Exception as e:
-                logger.error(f"Ошибка записи {filepath}: {e}")
+                logger.error(f"❌ Ошибка подписчика событий броней: {e}")
+    
+    def _rebuild_indexes(self):
+        """Перестроить индексы активных броней (вызывается под self.lock)"""
+        self._rooms = {room_id: RoomOccupancy() for room_id in ROOMS}
+        self._by_id = {}
+        self._by_user = {}
+        self._series = {}
+        self._occurrences = {}
+        self._expanded = None
+        for booking in self._bookings:
+            self._by_id[booking.id] = booking
+            if booking.is_active:
+                self._index_add(booking)
+    
+    @staticmethod
+    def _user_sort_key(booking: Booking):
+        return (booking.start, booking.id)
+    
+    def _room(self, room_id: str) -> RoomOccupancy:
+        """Индекс комнаты (комнаты, убранной из настроек, тоже - ее брони остаются занятостью)"""
+        occupancy = self._rooms.get(room_id)
+        if occupancy is None:
+            occupancy = self._rooms[room_id] = RoomOccupancy()
+        return occupancy
+    
+    def _touch_day(self, day):
+        """Отметить, что состав броней дня изменился"""
+        self._version_counter += 1
+        self._day_versions[day] = self._version_counter
+    
+    def _index_add(self, booking: Booking):
+        """Добавить активную бронь в индексы по дням и по пользователю"""
+        insort(self._by_user.setdefault(booking.user_id, []), booking, key=self._user_sort_key)
+        if booking.is_series:
+            # В индексы занятости попадают вхождения, и только в раскрытом окне
+            self._series[booking.id] = booking
+            self._occurrences[booking.id] = {}
+            if self._expanded is not None:
+                self._expand_series_locked(booking, *self._expanded)
+            return
+        self._touch_day(booking.start.date())
+        self._room(booking.room_id).add(booking)
+    
+    def _index_remove(self, booking: Booking):
+        """Убрать бронь из индексов по дням и по пользователю"""
+        if booking.is_series:
+            self._series.pop(booking.id, None)
+            for day, occurrence in self._occurrences.pop(booking.id, {}).items():
+                self._room(booking.room_id).remove(occurrence)
+                self._touch_day(day)
+        else:
+            self._touch_day(booking.start.date())
+            self._room(booking.room_id).remove(booking)
+        user_bookings = self._by_user.get(booking.user_id, [])
+        index = bisect_left(user_bookings, self._user_sort_key(booking), key=self._user_sort_key)
+        if index < len(user_bookings) and user_bookings[index] is booking:
+            del user_bookings[index]
+            if not user_bookings:
+                del self._by_user[booking.user_id]
+    
+    def _expand_series_locked(self, series: Booking, first: date, last: date):
+        """Добавить в кэш и индексы занятости вхождения серии на даты [first, last]"""
+        cache = self._occurrences[series.id]
+        for day in series.occurrence_days(first, last):
+            if day not in cache:
+                occurrence = cache[day] = series.occurrence(day)
+                self._room(series.room_id).add(occurrence)
+                self._touch_day(day)
+    
+    def _expand_locked(self, first: date, last: date):
+        """Раскрыть вхождения всех серий на даты [first, last] (вызывается под self.lock)
+        
+        Раскрытое окно только растет (сужается при архивации прошедших дней),
+        поэтому повторные запросы тех же дат ничего не пересчитывают.
+        """
+        # Вхождение предыдущего дня может заходить за полночь
+        first -= timedelta(days=1)
+        if self._expanded is None:
+            ranges = [(first, last)]
+            self._expanded = (first, last)
+        else:
+            known_first, known_last = self._expanded
+            if known_first <= first and last <= known_last:
+                return
+            ranges = []
+            if first < known_first:
+                ranges.append((first, known_first - timedelta(days=1)))
+            if last > known_last:
+                ranges.append((known_last + timedelta(days=1), last))
+            self._expanded = (min(first, known_first), max(last, known_last))
+        for series in self._series.values():
+            for since, until in ranges:
+                self._expand_series_locked(series, since, until)
+    
+    def _drop_occurrences_before_locked(self, day: date):
+        """Убрать из кэша и индексов вхождения серий до day (вызывается под self.lock)"""
+        for series_id, cache in self._occurrences.items():
+            room = self._room(self._series[series_id].room_id)
+            for past_day in [d for d in cache if d < day]:
+                room.remove(cache.pop(past_day))
+        if self._expanded is not None and self._expanded[0] < day:
+            self._expanded = (day, max(day, self._expanded[1]))
     
     def get_user_language(self, user_id: int) -> Optional[str]:
-        """Получить язык пользователя"""
-        users = self._read_json(self.users_file)
-        user = users.get(str(user_id))
-        return user.get('language') if user else None
+        """Получить язык пользователя (из кэша профилей, без чтения файла)"""
+        return self.users.get_language(user_id)
     
     def set_user_language(self, user_id: int, language: str, first_name: str = None, 
                          last_name: str = None, username: str = None):
         """Установить язык пользователя"""
-        users = self._read_json(self.users_file)
-        users[str(user_id)] = {
+        self.users.set(user_id, {
             'language': language,
             'first_name': first_name,
             'last_name': last_name,
             'username': username,
             'updated_at': datetime.now().isoformat()
-        }
-        self._write_json(self.users_file, users)
+        })
         logger.info(f"Пользователь {user_id} выбрал язык: {language}")
     
     def create_booking(self, user_id: int, user_name: str, start_time: str, 
-                      end_time: str, description: str) -> bool:
+                      end_time: str, description: str, room_id: Optional[str] = DEFAULT_ROOM,
+                      recurrence: Optional[Recurrence] = None) -> bool:
         """Создать бронирование"""
+        return self.try_create_booking(user_id, user_name, start_time, end_time, description,
+                                       room_id, recurrence).created
+    
+    def try_create_booking(self, user_id: int, user_name: str, start_time: str,
+                           end_time: str, description: str,
+                           room_id: Optional[str] = DEFAULT_ROOM,
+                           recurrence: Optional[Recurrence] = None) -> 'BookingResult':
+        """Атомарно проверить пересечение, выдать ID и сохранить бронь
+        
+        Проверка и выдача ID выполняются под одной блокировкой, поэтому два
+        одновременных подтверждения не могут занять одно и то же время.
+        room_id=None - любая свободная комната (первая по порядку в ROOMS).
+        С recurrence создается серия: start_time/end_time - первое вхождение.
+        Результат возвращается только после того, как бронь записана на диск.
+        """
         try:
-            bookings = self._read_json(self.bookings_file)
-            counter = self._read_json(self.booking_id_file)
-            
-            booking_id = counter.get('next_id', 1)
-            
-            booking = {
-                'id': booking_id,
-                'user_id': user_id,
-                'user_name': user_name,
-                'start_time': start_time,
-                'end_time': end_time,
-                'description': description,
-                'created_at': datetime.now().isoformat(),
-                'status': 'active'
-            }
-            
-            bookings.append(booking)
-            self._write_json(self.bookings_file, bookings)
+            start = datetime.fromisoformat(start_time)
+            end = datetime.fromisoformat(end_time)
+            if recurrence is not None and not recurrence.occurs_on(start.date(), start.date()):
+                raise ValueError(f"{start.date()} не подходит под правило повторения {recurrence.freq.value}")
             
-            counter['next_id'] = booking_id + 1
-            self._write_json(self.booking_id_file, counter)
+            with self.lock:
+                if room_id is None:
+                    free_rooms = self._find_free_rooms_locked(start, end, recurrence)
+                    room_id = free_rooms[0] if free_rooms else DEFAULT_ROOM
+                conflict = self._find_conflict_locked(start, end, room_id, recurrence)
+                if conflict is not None:
+                    logger.info(f"⛔ Время {start_time} - {end_time} в комнате {room_id} "
+                                f"пересекается с бронью #{conflict.id}")
+                    return BookingResult(BookingResult.CONFLICT, conflict=conflict.copy())
+                
+                booking = self._create_booking_locked(user_id, user_name, start, end, description,
+                                                      room_id, recurrence)
+                saved = self._committer.submit(
+                    [{'op': 'create', 'booking': booking.to_dict()}],
+                    functools.partial(self._rollback_create, booking)
+                )
+                result = booking.copy()
             
-            logger.info(f"✅ Бронирование #{booking_id} создано для {user_name}")
-            return True
+            # Ждем записи вне блокировки, чтобы другие изменения попали в ту же пачку
+            saved.result()
+            logger.info(f"✅ Бронирование #{result.id} создано для {user_name}")
+            self._notify('created', result)
+            return BookingResult(BookingResult.CREATED, booking=result)
         except Exception as e:
             logger.error(f"Ошибка создания бронирования: {e}")
-            return False
+            return BookingResult(BookingResult.ERROR, error=str(e))
     
-    def get_user_bookings(self, user_id: int) -> List[Dict]:
+    def _create_booking_locked(self, user_id: int, user_name: str, start: datetime,
+                               end: datetime, description: str, room_id: str,
+                               recurrence: Optional[Recurrence] = None) -> Booking:
+        """Создать бронирование в памяти (вызывается под self.lock)"""
+        booking_id = self._next_id
+            
+        booking = Booking(
+            id=booking_id,
+            user_id=user_id,
+            user_name=user_name,
+            start=start,
+            end=end,
+            description=description,
+            created_at=datetime.now(),
+            room_id=room_id,
+            recurrence=recurrence.copy() if recurrence is not None else None,
+        )
+        
+        self._bookings.append(booking)
+        self._by_id[booking_id] = booking
+        self._index_add(booking)
+        self._next_id = booking_id + 1
+        return booking
+    
+    def _rollback_create(self, booking: Booking):
+        """Откатить несохраненное создание брони (вызывается под self.lock)"""
+        if booking.is_active:
+            self._index_remove(booking)
+        self._bookings.remove(booking)
+        self._by_id.pop(booking.id, None)
+    
+    def get_user_bookings(self, user_id: int) -> List[Booking]:
         """Получить брони пользователя"""
-        bookings = self._read_json(self.bookings_file)
-        user_bookings = [b for b in bookings if b['user_id'] == user_id and b['status'] == 'active']
-        return sorted(user_bookings, key=lambda x: x['start_time'])
+        with self.lock:
+            return [b.copy() for b in self._by_user.get(user_id, [])]
+    
+    def get_user_bookings_page(self, user_id: int, cursor: Optional[Tuple[datetime, int]] = None,
+                               limit: int = BOOKINGS_PAGE_SIZE, before: bool = False) -> BookingPage:
+        """Страница броней пользователя по курсору (время начала, ID)
+        
+        Без курсора - первая страница; иначе limit броней после курсора или,
+        если before=True, перед ним. Поиск - bisect по индексу пользователя,
+        копируются только брони страницы.
+        """
+        with self.lock:
+            user_bookings = self._by_user.get(user_id, [])
+            if cursor is None:
+                first, last = 0, limit
+            elif before:
+                last = bisect_left(user_bookings, cursor, key=self._user_sort_key)
+                first = max(last - limit, 0)
+                if first == 0:
+                    last = limit  # у начала списка показываем полную первую страницу
+            else:
+                first = bisect_right(user_bookings, cursor, key=self._user_sort_key)
+                last = first + limit
+            last = min(last, len(user_bookings))
+            return BookingPage(
+                bookings=[b.copy() for b in user_bookings[first:last]],
+                has_prev=first > 0,
+                has_next=last < len(user_bookings),
+            )
     
-    def get_booking(self, booking_id: int) -> Optional[Dict]:
+    def get_booking(self, booking_id: int) -> Optional[Booking]:
         """Получить бронь по ID"""
-        bookings = self._read_json(self.bookings_file)
-        for booking in bookings:
-            if booking['id'] == booking_id:
-                return booking
+        with self.lock:
+            booking = self._by_id.get(booking_id)
+            return booking.copy() if booking else None
+    
+    def _starting_on_locked(self, day) -> List[Booking]:
+        """Брони всех комнат, начинающиеся в этот день, по времени (вызывается под self.lock)"""
+        bookings = []
+        for occupancy in self._rooms.values():
+            bookings.extend(occupancy.starting_on(day))
+        if len(self._rooms) > 1:
+            bookings.sort(key=self._user_sort_key)
+        return bookings
+    
+    def get_bookings_by_date(self, date_str: str, room_id: Optional[str] = None) -> List[Booking]:
+        """Получить брони на конкретную дату (room_id=None - во всех комнатах)"""
+        day = datetime.fromisoformat(date_str).date()
+        
+        with self.lock:
+            self._expand_locked(day, day)
+            if room_id is not None:
+                return [b.copy() for b in self._room(room_id).starting_on(day)]
+            return [b.copy() for b in self._starting_on_locked(day)]
+    
+    def _find_conflict_locked(self, start: datetime, end: datetime, room_id: str,
+                              recurrence: Optional[Recurrence] = None) -> Optional[Booking]:
+        """Бронь или вхождение серии комнаты, пересекающиеся с [start, end) (вызывается под self.lock)
+        
+        Для новой серии проверяются ее вхождения. Разовые брони бывают только в
+        пределах MAX_BOOKING_DAYS, а пересечения серий между собой повторяются
+        с периодом в неделю - но только после начала и последнего исключения
+        каждой серии (отмененное вхождение прячет пересечение в своем дне).
+        Поэтому окно - до горизонта бронирования и на две недели дальше
+        самой поздней даты начала или исключения серий комнаты.
+        """
+        if recurrence is None:
+            self._expand_locked(start.date(), end.date())
+            return self._room(room_id).find_overlap(start, end)
+        
+        candidate = Booking(0, 0, '', start, end, '', None, room_id=room_id, recurrence=recurrence)
+        first = start.date()
+        horizon = max([now_baku().date() + timedelta(days=MAX_BOOKING_DAYS), first] +
+                      [max([s.start.date()] + list(s.recurrence.exceptions))
+                       for s in self._series.values() if s.room_id == room_id])
+        horizon += timedelta(weeks=2)
+        self._expand_locked(first, horizon)
+        occupancy = self._room(room_id)
+        for day in candidate.occurrence_days(first, horizon):
+            occurrence = candidate.occurrence(day)
+            conflict = occupancy.find_overlap(occurrence.start, occurrence.end)
+            if conflict is not None:
+                return conflict
         return None
     
-    def get_bookings_by_date(self, date_str: str) -> List[Dict]:
-        """Получить брони на конкретную дату"""
-        bookings = self._read_json(self.bookings_file)
-        date_bookings = []
+    def find_conflict(self, start: datetime, end: datetime, room_id: str = DEFAULT_ROOM) -> Optional[Booking]:
+        """Найти активную бронь комнаты, пересекающуюся с интервалом [start, end)"""
+        with self.lock:
+            booking = self._find_conflict_locked(start, end, room_id)
+            return booking.copy() if booking else None
+    
+    def is_interval_free(self, start: datetime, end: datetime, room_id: str = DEFAULT_ROOM) -> bool:
+        """Проверить, свободен ли интервал [start, end) в комнате"""
+        return self.find_conflict(start, end, room_id) is None
+    
+    def _find_free_rooms_locked(self, start: datetime, end: datetime,
+                                recurrence: Optional[Recurrence] = None) -> List[str]:
+        """Комнаты из настроек, свободные на [start, end) (вызывается под self.lock)"""
+        return [room_id for room_id in ROOMS
+                if self._find_conflict_locked(start, end, room_id, recurrence) is None]
+    
+    def find_free_rooms(self, start: datetime, end: datetime) -> List[str]:
+        """Все свободные на интервале комнаты - один проход по индексам комнат"""
+        with self.lock:
+            return self._find_free_rooms_locked(start, end)
+    
+    def find_free_windows(self, minutes: int, limit: int = NEXT_FREE_WINDOWS,
+                          days: int = MAX_BOOKING_DAYS) -> List[FreeWindow]:
+        """Ближайшие limit свободных окон на minutes минут в пределах days дней
+        
+        По окну на каждый свободный промежуток (с самого раннего слота в нем);
+        если в одно время свободно несколько комнат - берется первая по ROOMS.
+        Промежутки ищутся по отсортированным индексам интервалов, дни
+        просматриваются по порядку, пока окон не наберется достаточно.
+        """
+        now = now_baku()
+        duration = timedelta(minutes=minutes)
+        windows: List[FreeWindow] = []
+        with self.lock:
+            self._expand_locked(now.date(), now.date() + timedelta(days=days - 1))
+            for offset in range(days):
+                day = now.date() + timedelta(days=offset)
+                starts: Dict[datetime, str] = {}
+                for room_id in ROOMS:
+                    for start in self._room(room_id).free_windows(day, minutes, now):
+                        starts.setdefault(start, room_id)
+                windows.extend(FreeWindow(start, start + duration, room_id)
+                               for start, room_id in sorted(starts.items()))
+                if len(windows) >= limit:
+                    break
+        return windows[:limit]
+    
+    def get_free_slots_mask(self, date_str: str, minutes: int = None, room_id: Optional[str] = None) -> int:
+        """Маска свободных слотов дня (бит i - слот i сетки DAY_GRID)
         
-        for booking in bookings:
-            if booking['status'] == 'active':
-                start = datetime.fromisoformat(booking['start_time'])
-                if start.date().isoformat() == date_str:
-                    date_bookings.append(booking)
+        Если задана длительность, бит означает, что с этого слота свободно
+        minutes минут подряд до закрытия комнаты. room_id=None - слот
+        свободен хотя бы в одной комнате.
+        """
+        day = datetime.fromisoformat(date_str).date()
+        room_ids = list(ROOMS) if room_id is None else [room_id]
+        with self.lock:
+            self._expand_locked(day, day)
+            free_masks = [self._room(r).free_mask(day) for r in room_ids]
+        result = 0
+        for free in free_masks:
+            result |= free if minutes is None else DAY_GRID.startable(free, minutes)
+        return result
+    
+    def get_free_run(self, date_str: str, time_str: str, room_id: Optional[str] = None) -> int:
+        """Сколько минут подряд свободно начиная со слота date_str time_str (0 - занято)
         
-        return sorted(date_bookings, key=lambda x: x['start_time'])
+        room_id=None - максимум по всем комнатам.
+        """
+        index = DAY_GRID.slot_index(datetime.fromisoformat(f"{date_str}T{time_str}"))
+        if index is None:
+            return 0
+        day = datetime.fromisoformat(date_str).date()
+        room_ids = list(ROOMS) if room_id is None else [room_id]
+        with self.lock:
+            self._expand_locked(day, day)
+            free_masks = [self._room(r).free_mask(day) for r in room_ids]
+        return max(DAY_GRID.free_runs(free)[index] for free in free_masks) * DAY_GRID.interval
     
-    def get_all_bookings(self) -> List[Dict]:
-        """Получить все активные брони"""
-        bookings = self._read_json(self.bookings_file)
-        return [b for b in bookings if b['status'] == 'active']
+    def get_all_bookings(self) -> List[Booking]:
+        """Получить все активные брони (серии - одной записью, без вхождений)"""
+        with self.lock:
+            return [b.copy() for b in self._bookings if b.is_active]
     
-    def get_upcoming_bookings(self, days: int = 7) -> List[Dict]:
+    def get_upcoming_bookings(self, days: int = 7) -> List[Booking]:
         """Получить предстоящие брони на ближайшие N дней"""
-        bookings = self._read_json(self.bookings_file)
         now = now_baku()
         end_date = now + timedelta(days=days)
         
         upcoming = []
-        for booking in bookings:
-            if booking['status'] == 'active':
-                start = datetime.fromisoformat(booking['start_time'])
-                if now <= start <= end_date:
-                    upcoming.append(booking)
+        with self.lock:
+            self._expand_locked(now.date(), end_date.date())
+            # Обходим только дни в окне, а не всю историю
+            day = now.date()
+            while day <= end_date.date():
+                for booking in self._starting_on_locked(day):
+                    if now <= booking.start <= end_date:
+                        upcoming.append(booking.copy())
+                day += timedelta(days=1)
         
-        return sorted(upcoming, key=lambda x: x['start_time'])
+        return upcoming
+    
+    def get_changed_days(self, days: List, known_versions: Dict) -> Dict:
+        """Брони дней, версия которых отличается от известной вызывающему
+        
+        Возвращает {дата: (версия, брони, начинающиеся в этот день)} только для
+        измененных дней - остальные вызывающий отрисовывает из своего кэша.
+        """
+        changed = {}
+        with self.lock:
+            if days:
+                self._expand_locked(min(days), max(days))
+            for day in days:
+                version = self._day_versions.get(day, 0)
+                if known_versions.get(day) == version:
+                    continue
+                changed[day] = (version, [b.copy() for b in self._starting_on_locked(day)])
+        return changed
     
     def cancel_booking(self, booking_id: int, user_id: int) -> bool:
         """Отменить бронирование"""
         try:
-            bookings = self._read_json(self.bookings_file)
+            with self.lock:
+                booking = self._by_id.get(booking_id)
+                if not (booking and booking.user_id == user_id and booking.is_active):
+                    logger.warning(f"Бронирование #{booking_id} не найдено или уже отменено")
+                    return False
+                
+                self._index_remove(booking)
+                booking.status = BookingStatus.CANCELLED
+                booking.cancelled_at = datetime.now()
+                saved = self._committer.submit(
+                    [{'op': 'cancel', 'id': booking_id, 'cancelled_at': booking.cancelled_at.isoformat()}],
+                    functools.partial(self._rollback_cancel, booking)
+                )
             
-            for booking in bookings:
-                if booking['id'] == booking_id and booking['user_id'] == user_id and booking['status'] == 'active':
-                    booking['status'] = 'cancelled'
-                    booking['cancelled_at'] = datetime.now().isoformat()
-                    self._write_json(self.bookings_file, bookings)
-                    logger.info(f"✅ Бронирование #{booking_id} отменено")
-                    return True
-            
-            logger.warning(f"Бронирование #{booking_id} не найдено или уже отменено")
-            return False
+            saved.result()
+            logger.info(f"✅ Бронирование #{booking_id} отменено")
+            self._notify('cancelled', booking)
+            return True
         except Exception as e:
             logger.error(f"Ошибка отмены бронирования: {e}")
             return False
     
-    def cleanup_old_bookings(self, days: int = 30):
-        """Удалить старые отменённые брони"""
+    def _rollback_cancel(self, booking: Booking):
+        """Откатить несохраненную отмену - бронь снова активна (вызывается под self.lock)"""
+        if booking.status is BookingStatus.CANCELLED and self._by_id.get(booking.id) is booking:
+            booking.status = BookingStatus.ACTIVE
+            booking.cancelled_at = None
+            self._index_add(booking)
+    
+    def cancel_occurrence(self, series_id: int, day: date, user_id: int) -> bool:
+        """Отменить одно вхождение серии - в серию записывается исключение"""
         try:
-            bookings = self._read_json(self.bookings_file)
-            cutoff_date = datetime.now() - timedelta(days=days)
+            with self.lock:
+                series = self._series.get(series_id)
+                if not (series and series.user_id == user_id
+                        and series.recurrence.occurs_on(series.start.date(), day)):
+                    logger.warning(f"Вхождение серии #{series_id} на {day} не найдено или уже отменено")
+                    return False
+                
+                series.recurrence.exceptions.add(day)
+                occurrence = self._occurrences[series_id].pop(day, None)
+                if occurrence is not None:
+                    self._room(series.room_id).remove(occurrence)
+                    self._touch_day(day)
+                else:
+                    occurrence = series.occurrence(day)
+                saved = self._committer.submit(
+                    [{'op': 'skip', 'id': series_id, 'date': day.isoformat()}],
+                    functools.partial(self._rollback_skip, series, day)
+                )
             
-            filtered_bookings = []
-            removed_count = 0
+            saved.result()
+            logger.info(f"✅ Вхождение серии #{series_id} на {day} отменено")
+            self._notify('skipped', occurrence)
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка отмены вхождения серии: {e}")
+            return False
+    
+    def _rollback_skip(self, series: Booking, day: date):
+        """Откатить несохраненное исключение серии (вызывается под self.lock)"""
+        series.recurrence.exceptions.discard(day)
+        if self._series.get(series.id) is series and self._expanded is not None:
+            first, last = self._expanded
+            if first <= day <= last:
+                self._expand_series_locked(series, day, day)
+    
+    def cleanup_old_bookings(self, days: int = 30) -> int:
+        """Удалить старые отменённые брони; возвращает число удаленных"""
+        try:
+            cutoff_date = datetime.now() - timedelta(days=days)
             
-            for booking in bookings:
-                if booking['status'] == 'cancelled':
-                    cancelled_at = datetime.fromisoformat(booking.get('cancelled_at', booking['created_at']))
-                    if cancelled_at < cutoff_date:
-                        removed_count += 1
-                        continue
-                filtered_bookings.append(booking)
+            with self.lock:
+                filtered_bookings = []
+                removed = []
+                
+                for booking in self._bookings:
+                    if booking.status is BookingStatus.CANCELLED:
+                        cancelled_at = booking.cancelled_at or booking.created_at
+                        if cancelled_at is not None and cancelled_at < cutoff_date:
+                            removed.append(booking)
+                            continue
+                    filtered_bookings.append(booking)
+                
+                if not removed:
+                    return 0
+                
+                self._bookings = filtered_bookings
+                for booking in removed:
+                    del self._by_id[booking.id]
+                saved = self._committer.submit(
+                    [{'op': 'purge', 'ids': [b.id for b in removed]}],
+                    functools.partial(self._rollback_purge, removed)
+                )
             
-            self._write_json(self.bookings_file, filtered_bookings)
-            if removed_count > 0:
-                logger.info(f"🧹 Удалено {removed_count} старых отменённых бронирований")
+            saved.result()
+            logger.info(f"🧹 Удалено {len(removed)} старых отменённых бронирований")
+            return len(removed)
         except Exception as e:
             logger.error(f"Ошибка очистки: {e}")
+            return 0
+    
+    def _rollback_purge(self, removed: List[Booking]):
+        """Вернуть в память брони, удаление которых не сохранилось (вызывается под self.lock)"""
+        for booking in removed:
+            self._bookings.append(booking)
+            self._by_id[booking.id] = booking
+            if booking.is_active:
+                self._index_add(booking)
+    
+    def archive_past_bookings(self, before: Optional[datetime] = None) -> int:
+        """Перенести в архив брони, закончившиеся до начала текущего дня
+        
+        В рабочем хранилище остаются только сегодняшние и будущие брони
+        (горизонт MAX_BOOKING_DAYS), поэтому запросы и перезапись файлов не
+        платят за историю. Сначала пишется архив, затем удаление из рабочего
+        хранилища: при сбое между шагами архив просто перезапишется теми же ID.
+        Серия переносится, когда закончилось ее последнее вхождение.
+        """
+        cutoff = before or datetime.combine(now_baku().date(), time())
+        try:
+            with self.lock:
+                # Прошедшие вхождения серий больше не нужны ни в кэше, ни в индексах
+                self._drop_occurrences_before_locked(cutoff.date() - timedelta(days=1))
+                past = [b for b in self._bookings if b.last_end is not None and b.last_end <= cutoff]
+                if not past:
+                    return 0
+                
+                self.archive.append([b.to_dict() for b in past])
+                
+                past_ids = {b.id for b in past}
+                self._bookings = [b for b in self._bookings if b.id not in past_ids]
+                for booking in past:
+                    del self._by_id[booking.id]
+                    if booking.is_active:
+                        self._index_remove(booking)
+                # Версии прошедших дней кэшу отрисовки больше не нужны
+                for day in [day for day in self._day_versions if day < cutoff.date()]:
+                    del self._day_versions[day]
+                saved = self._committer.submit(
+                    [{'op': 'purge', 'ids': sorted(past_ids)}],
+                    functools.partial(self._rollback_purge, past)
+                )
+            
+            saved.result()
+            logger.info(f"🗄 В архив перенесено бронирований: {len(past)}")
+            return len(past)
+        except Exception as e:
+            logger.error(f"Ошибка архивации: {e}")
+            return 0
+    
+    def index_days(self) -> List:
+        """Дни, которые должны быть (или уже есть) в индексах занятости комнат"""
+        with self.lock:
+            days = set()
+            for occupancy in self._rooms.values():
+                days.update(occupancy.days)
+            for booking in self._bookings:
+                if booking.is_active and not booking.is_series:
+                    days.update(booking_days(booking.start, booking.end))
+            for cache in self._occurrences.values():
+                for occurrence in cache.values():
+                    days.update(booking_days(occurrence.start, occurrence.end))
+        return sorted(days)
+    
+    def verify_day_index(self, day) -> int:
+        """Сверить индексы и карты занятости дня во всех комнатах с бронями
+        
+        Расходящиеся комнаты перестраиваются; возвращает число исправленных комнат.
+        """
+        with self.lock:
+            expected: Dict[str, List[Booking]] = {}
+            for booking in self._bookings:
+                if booking.is_active and not booking.is_series and day in booking_days(booking.start, booking.end):
+                    expected.setdefault(booking.room_id, []).append(booking)
+            # Вхождения серий сверяются с кэшем раскрытых вхождений
+            for cache in self._occurrences.values():
+                for occurrence in (cache.get(day), cache.get(day - timedelta(days=1))):
+                    if occurrence is not None and day in booking_days(occurrence.start, occurrence.end):
+                        expected.setdefault(occurrence.room_id, []).append(occurrence)
+            
+            repaired = 0
+            for room_id in set(expected) | set(self._rooms):
+                room_bookings = sorted(expected.get(room_id, []), key=self._user_sort_key)
+                occupancy = self._room(room_id)
+                intervals = occupancy.days.get(day)
+                indexed = sorted(intervals.bookings, key=self._user_sort_key) if intervals is not None else []
+                mask = 0
+                for booking in room_bookings:
+                    mask |= DAY_GRID.mask_for(day, booking.start, booking.end)
+                if (len(indexed) == len(room_bookings)
+                        and all(a is b for a, b in zip(indexed, room_bookings))
+                        and occupancy.bitmaps.get(day, 0) == mask):
+                    continue
+                
+                logger.warning(f"⚠️ Индекс занятости {day} ({room_id}) расходится с бронями - перестраиваем")
+                occupancy.rebuild_day(day, room_bookings)
+                repaired += 1
+            if repaired:
+                self._touch_day(day)
+            return repaired
+    
+    def verify_lookup_indexes(self) -> int:
+        """Сверить индексы по ID и по пользователю; возвращает число исправленных записей"""
+        with self.lock:
+            by_id = {b.id: b for b in self._bookings}
+            by_user: Dict[int, List[Booking]] = {}
+            for booking in sorted((b for b in self._bookings if b.is_active), key=self._user_sort_key):
+                by_user.setdefault(booking.user_id, []).append(booking)
+            
+            repaired = sum(1 for i in by_id.keys() | self._by_id.keys()
+                           if by_id.get(i) is not self._by_id.get(i))
+            for user_id in by_user.keys() | self._by_user.keys():
+                if [b.id for b in by_user.get(user_id, [])] != [b.id for b in self._by_user.get(user_id, [])]:
+                    repaired += 1
+            if repaired:
+                logger.warning(f"⚠️ Индексы по ID/пользователю расходятся с бронями ({repaired}) - перестраиваем")
+                self._by_id = by_id
+                self._by_user = by_user
+            return repaired
+    
+    def compact_storage(self) -> int:
+        """Свернуть журналы броней и пользователей; возвращает число освобожденных байт"""
+        reclaimed = self._committer.maintain().result()
+        reclaimed += self.users.compact()
+        return reclaimed
     
     def export_bookings(self, filename: str = "bookings_export.json"):
         """Экспортировать все брони в файл"""
         try:
-            bookings = self._read_json(self.bookings_file)
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(bookings, f, ensure_ascii=False, indent=2)
+            with self.lock:
+                bookings = [b.to_dict() for b in self._bookings]
+            write_json_file(filename, bookings)
             logger.info(f"📤 Брони экспортированы в {filename}")
             return True
         except Exception as e:
             logger.error(f"Ошибка экспорта: {e}")
             return False
+
+
+# Реестр хранилищ: один экземпляр Database (и одна блокировка) на каталог данных
+_registry: Dict[str, Database] = {}
+_registry_lock = threading.Lock()
+
+
+def get_database(data_dir: str = "data", backend: str = STORAGE_BACKEND) -> Database:
+    """Получить общий для процесса экземпляр Database для каталога данных
+    
+    Несколько экземпляров над одними файлами имели бы разные блокировки и
+    разное состояние в памяти, поэтому все обращения идут через этот реестр.
+    """
+    key = os.path.abspath(data_dir)
+    with _registry_lock:
+        db = _registry.get(key)
+        if db is None:
+            db = Database(data_dir, backend)
+            _registry[key] = db
+        elif db.backend != backend:
+            raise ValueError(f"Каталог {data_dir} уже открыт с бэкендом {db.backend}")
+        return db
+
+
+class AsyncDatabase:
+    """Асинхронный фасад над Database для обработчиков бота
+    
+    Каждый вызов выполняется в отдельном пуле потоков, поэтому файловый
+    ввод-вывод и ожидание блокировки не останавливают event loop.
+    """
+    
+    def __init__(self, db: Database, max_workers: int = DB_EXECUTOR_WORKERS):
+        self.db = db
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db")
+    
+    async def _run(self, func, *args, **kwargs):
+        """Выполнить синхронный метод Database в пуле потоков"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+    
+    async def get_user_language(self, user_id: int) -> Optional[str]:
+        # Самое частое чтение: при попадании в кэш профилей - без перехода в пул потоков
+        hit, language = self.db.users.cached_language(user_id)
+        if hit:
+            return language
+        return await self._run(self.db.get_user_language, user_id)
+    
+    async def set_user_language(self, user_id: int, language: str, first_name: str = None,
+                                last_name: str = None, username: str = None):
+        return await self._run(self.db.set_user_language, user_id, language,
+                               first_name=first_name, last_name=last_name, username=username)
+    
+    async def create_booking(self, user_id: int, user_name: str, start_time: str,
+                             end_time: str, description: str, room_id: Optional[str] = DEFAULT_ROOM,
+                             recurrence: Optional[Recurrence] = None) -> bool:
+        return await self._run(self.db.create_booking, user_id, user_name, start_time, end_time,
+                               description, room_id, recurrence)
+    
+    async def try_create_booking(self, user_id: int, user_name: str, start_time: str,
+                                 end_time: str, description: str,
+                                 room_id: Optional[str] = DEFAULT_ROOM,
+                                 recurrence: Optional[Recurrence] = None) -> BookingResult:
+        return await self._run(self.db.try_create_booking, user_id, user_name, start_time, end_time,
+                               description, room_id, recurrence)
+    
+    async def get_user_bookings(self, user_id: int) -> List[Booking]:
+        return await self._run(self.db.get_user_bookings, user_id)
+    
+    async def get_user_bookings_page(self, user_id: int, cursor: Optional[Tuple[datetime, int]] = None,
+                                     limit: int = BOOKINGS_PAGE_SIZE, before: bool = False) -> BookingPage:
+        return await self._run(self.db.get_user_bookings_page, user_id, cursor, limit, before)
+    
+    async def get_booking(self, booking_id: int) -> Optional[Booking]:
+        return await self._run(self.db.get_booking, booking_id)
+    
+    async def get_bookings_by_date(self, date_str: str, room_id: Optional[str] = None) -> List[Booking]:
+        return await self._run(self.db.get_bookings_by_date, date_str, room_id)
+    
+    async def find_conflict(self, start: datetime, end: datetime, room_id: str = DEFAULT_ROOM) -> Optional[Booking]:
+        return await self._run(self.db.find_conflict, start, end, room_id)
+    
+    async def is_interval_free(self, start: datetime, end: datetime, room_id: str = DEFAULT_ROOM) -> bool:
+        return await self._run(self.db.is_interval_free, start, end, room_id)
+    
+    async def find_free_rooms(self, start: datetime, end: datetime) -> List[str]:
+        return await self._run(self.db.find_free_rooms, start, end)
+    
+    async def find_free_windows(self, minutes: int, limit: int = NEXT_FREE_WINDOWS,
+                                days: int = MAX_BOOKING_DAYS) -> List[FreeWindow]:
+        return await self._run(self.db.find_free_windows, minutes, limit, days)
+    
+    async def get_free_slots_mask(self, date_str: str, minutes: int = None, room_id: Optional[str] = None) -> int:
+        return await self._run(self.db.get_free_slots_mask, date_str, minutes, room_id)
+    
+    async def get_free_run(self, date_str: str, time_str: str, room_id: Optional[str] = None) -> int:
+        return await self._run(self.db.get_free_run, date_str, time_str, room_id)
+    
+    async def get_all_bookings(self) -> List[Booking]:
+        return await self._run(self.db.get_all_bookings)
+    
+    async def get_upcoming_bookings(self, days: int = 7) -> List[Booking]:
+        return await self._run(self.db.get_upcoming_bookings, days)
+    
+    async def get_changed_days(self, days: List, known_versions: Dict) -> Dict:
+        return await self._run(self.db.get_changed_days, days, known_versions)
+    
+    async def cancel_booking(self, booking_id: int, user_id: int) -> bool:
+        return await self._run(self.db.cancel_booking, booking_id, user_id)
+    
+    async def cancel_occurrence(self, series_id: int, day: date, user_id: int) -> bool:
+        return await self._run(self.db.cancel_occurrence, series_id, day, user_id)
+    
+    async def cleanup_old_bookings(self, days: int = 30) -> int:
+        return await self._run(self.db.cleanup_old_bookings, days)
+    
+    async def archive_past_bookings(self, before: Optional[datetime] = None) -> int:
+        return await self._run(self.db.archive_past_bookings, before)
+    
+    async def export_bookings(self, filename: str = "bookings_export.json"):
+        return await self._run(self.db.export_bookings, filename)
+    
+    def close(self):
+        """Дождаться завершения операций и остановить пул потоков"""
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,129 @@
+"""
+Кэш отрисовки сводки броней на неделю
+Фрагменты HTML хранятся по (день, язык) и пересобираются только для измененных дней
+"""
+
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config import DIGEST_PAGE_CHARS, ROOMS
+from models import Booking
+from translations import get_text
+
+
+class DayFragment:
+    """Отрисованный день: заголовок и по строке на каждую бронь (по времени начала)"""
+
+    __slots__ = ('version', 'header', 'starts', 'lines', 'text')
+
+    def __init__(self, version: int, header: str, bookings: List[Booking]):
+        self.version = version
+        self.header = header
+        self.starts = [b.start for b in bookings]
+        self.lines = [
+            f"⏰ {b.start.strftime('%H:%M')} - {b.end.strftime('%H:%M')}{' 🔁' if b.series_id is not None else ''}\n"
+            f"👤 {b.user_name}\n"
+            + (f"🚪 {b.room_name}\n" if len(ROOMS) > 1 else '') +
+            f"📝 {b.description}\n"
+            f"{'─' * 30}\n"
+            for b in bookings
+        ]
+        self.text = header + ''.join(self.lines) if bookings else ''
+
+    def render(self, since: Optional[datetime] = None, until: Optional[datetime] = None) -> str:
+        """Фрагмент дня; since/until обрезают брони на границах окна (сегодня и последний день)"""
+        if since is None and until is None:
+            return self.text
+        first = bisect_left(self.starts, since) if since is not None else 0
+        last = bisect_right(self.starts, until) if until is not None else len(self.starts)
+        if first >= last:
+            return ''
+        if first == 0 and last == len(self.starts):
+            return self.text
+        return self.header + ''.join(self.lines[first:last])
+
+
+class WeekDigest:
+    """Сводка «брони на ближайшие дни» как склейка закэшированных фрагментов дней
+
+    Database ведет версию каждого дня (меняется при создании и отмене брони),
+    поэтому фрагмент пересобирается, только если версия дня изменилась.
+    Прошедшие дни вытесняются из кэша при смене даты. Длинная сводка
+    делится на страницы по целым дням, не длиннее page_chars символов.
+    """
+
+    def __init__(self, format_date: Callable[[date, str], str], page_chars: int = DIGEST_PAGE_CHARS):
+        self.format_date = format_date
+        self.page_chars = page_chars
+        self._fragments: Dict[Tuple[date, str], DayFragment] = {}
+
+    def known_versions(self, lang: str, days: List[date]) -> Dict[date, int]:
+        """Версии дней, для которых на этом языке уже есть фрагмент"""
+        versions = {}
+        for day in days:
+            fragment = self._fragments.get((day, lang))
+            if fragment is not None:
+                versions[day] = fragment.version
+        return versions
+
+    def update(self, lang: str, changed: Dict[date, Tuple[int, List[Booking]]]):
+        """Пересобрать фрагменты измененных дней"""
+        for day, (version, bookings) in changed.items():
+            # Обновления обрабатываются параллельно - не затираем более свежий фрагмент
+            fragment = self._fragments.get((day, lang))
+            if fragment is not None and fragment.version > version:
+                continue
+            header = f"\n<b>{self.format_date(day, lang)}</b>\n"
+            self._fragments[(day, lang)] = DayFragment(version, header, bookings)
+
+    def evict_before(self, today: date):
+        """Убрать фрагменты прошедших дней"""
+        for key in [key for key in self._fragments if key[0] < today]:
+            del self._fragments[key]
+
+    def _take(self, parts: List[Tuple[date, str]], budget: int) -> int:
+        """Сколько фрагментов подряд помещается в budget символов (минимум один)"""
+        count, size = 0, 0
+        for _, text in parts:
+            if count and size + len(text) > budget:
+                break
+            count += 1
+            size += len(text)
+        return count
+
+    def render(self, lang: str, now: datetime, until: datetime, days: List[date],
+               start_day: Optional[date] = None) -> Tuple[str, Optional[date], Optional[date]]:
+        """Страница сводки за окно [now, until], начиная с дня start_day
+
+        Возвращает (текст, первый день предыдущей страницы, первый день следующей);
+        дни соседних страниц - курсоры для кнопок листания или None.
+        """
+        parts = []
+        for day in days:
+            fragment = self._fragments.get((day, lang))
+            if fragment is None:
+                continue
+            text = fragment.render(
+                since=now if day == now.date() else None,
+                until=until if day == until.date() else None,
+            )
+            if text:
+                parts.append((day, text))
+        if not parts:
+            return get_text(lang, 'no_bookings'), None, None
+
+        title = get_text(lang, 'upcoming_bookings')
+        budget = self.page_chars - len(title)
+        first = 0
+        if start_day is not None:
+            first = next((i for i, (day, _) in enumerate(parts) if day >= start_day), 0)
+        last = first + self._take(parts[first:], budget)
+
+        prev_day = None
+        if first > 0:
+            # Предыдущая страница - столько дней перед текущей, сколько помещается
+            back = self._take(parts[first - 1::-1], budget)
+            prev_day = parts[first - back][0]
+        next_day = parts[last][0] if last < len(parts) else None
+        return title + ''.join(text for _, text in parts[first:last]), prev_day, next_day
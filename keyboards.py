@@ -0,0 +1,87 @@
+"""
+Статические клавиатуры бота
+Собираются один раз на язык и переиспользуются (InlineKeyboardMarkup неизменяем)
+"""
+
+from functools import lru_cache
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from config import BOOKING_DURATIONS
+from translations import get_text
+
+
+@lru_cache(maxsize=None)
+def main_menu_keyboard(lang):
+    """Главное меню в личном чате"""
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(get_text(lang, 'btn_view_bookings'), callback_data="view_bookings")],
+        [InlineKeyboardButton(get_text(lang, 'btn_create_booking'), callback_data="create_booking")],
+        [InlineKeyboardButton(get_text(lang, 'btn_next_free'), callback_data="next_free")],
+        [InlineKeyboardButton(get_text(lang, 'btn_my_bookings'), callback_data="my_bookings")],
+        [InlineKeyboardButton(get_text(lang, 'btn_help'), callback_data="help")],
+        [InlineKeyboardButton(get_text(lang, 'btn_change_language'), callback_data="change_language")]
+    ])
+
+
+@lru_cache(maxsize=None)
+def group_menu_keyboard(lang, bot_username):
+    """Упрощенное меню в группе"""
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(get_text(lang, 'btn_view_bookings'), callback_data="view_bookings")],
+        [InlineKeyboardButton("➕ Забронировать (в личном чате)", url=f"https://t.me/{bot_username}?start=booking")]
+    ])
+
+
+@lru_cache(maxsize=None)
+def language_keyboard(with_back=False):
+    """Выбор языка (подписи кнопок всегда на своем языке)"""
+    keyboard = [
+        [InlineKeyboardButton(get_text('ru', 'language_russian'), callback_data="lang_ru")],
+        [InlineKeyboardButton(get_text('az', 'language_azerbaijani'), callback_data="lang_az")]
+    ]
+    if with_back:
+        keyboard.append([InlineKeyboardButton(get_text('ru', 'btn_back'), callback_data="back_to_menu")])
+    return InlineKeyboardMarkup(keyboard)
+
+
+@lru_cache(maxsize=None)
+def back_to_menu_keyboard(lang, key='btn_back'):
+    """Одна кнопка возврата в главное меню"""
+    return InlineKeyboardMarkup([[InlineKeyboardButton(get_text(lang, key), callback_data="back_to_menu")]])
+
+
+@lru_cache(maxsize=None)
+def duration_button(lang, minutes):
+    """Кнопка длительности"""
+    return InlineKeyboardButton(get_text(lang, f'duration_{minutes}'), callback_data=f"duration_{minutes}")
+
+
+@lru_cache(maxsize=None)
+def next_free_duration_keyboard(lang):
+    """Выбор длительности для поиска ближайшего свободного окна"""
+    keyboard = [
+        [InlineKeyboardButton(get_text(lang, f'duration_{minutes}'), callback_data=f"next_free_{minutes}")]
+        for minutes in BOOKING_DURATIONS
+    ]
+    keyboard.append([InlineKeyboardButton(get_text(lang, 'btn_back'), callback_data="back_to_menu")])
+    return InlineKeyboardMarkup(keyboard)
+
+
+@lru_cache(maxsize=None)
+def booking_done_keyboard(lang):
+    """Клавиатура после успешного бронирования"""
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(get_text(lang, 'btn_my_bookings'), callback_data="my_bookings")],
+        [InlineKeyboardButton(get_text(lang, 'btn_main_menu'), callback_data="back_to_menu")]
+    ])
+
+
+def page_nav_row(lang, prev_data=None, next_data=None):
+    """Ряд кнопок листания страниц (пустой, если листать некуда)"""
+    row = []
+    if prev_data:
+        row.append(InlineKeyboardButton(get_text(lang, 'btn_prev_page'), callback_data=prev_data))
+    if next_data:
+        row.append(InlineKeyboardButton(get_text(lang, 'btn_next_page'), callback_data=next_data))
+    return row
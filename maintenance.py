@@ -0,0 +1,116 @@
+"""
+Фоновое обслуживание хранилища на JobQueue бота
+Очистка, архив, проверка индексов и свертка журналов небольшими шагами
+"""
+
+import asyncio
+import functools
+import logging
+import time
+from dataclasses import dataclass, fields
+from datetime import time as daily_time
+from typing import Callable, Generator, Optional, Tuple
+
+from config import (
+    AUTO_CLEANUP_DAYS, MAINTENANCE_HOUR, MAINTENANCE_TICK_SECONDS, MAINTENANCE_TICK_BUDGET_MS,
+)
+from database import BAKU_TZ, Database
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class MaintenanceReport:
+    """Итог одного цикла обслуживания"""
+
+    purged: int = 0           # удалено старых отмененных броней
+    archived: int = 0         # перенесено в архив прошедших броней
+    days_checked: int = 0     # проверено дней индекса занятости
+    repaired: int = 0         # исправлено записей индексов
+    bytes_reclaimed: int = 0  # освобождено места сверткой журналов / WAL
+    errors: int = 0           # шагов, завершившихся ошибкой
+
+    def summary(self) -> str:
+        return ", ".join(f"{f.name}={getattr(self, f.name)}" for f in fields(self))
+
+
+class Maintenance:
+    """Цикл обслуживания, разбитый на короткие шаги
+
+    Раз в сутки (в нерабочее время комнаты) запускается цикл; дальше каждые
+    MAINTENANCE_TICK_SECONDS выполняются шаги, пока не истечет бюджет тика.
+    Шаги идут в пуле потоков и каждый держит блокировку хранилища недолго,
+    поэтому обработка обновлений от пользователей не останавливается.
+    """
+
+    JOB_NAME = "maintenance"
+
+    def __init__(self, db: Database, budget_ms: int = MAINTENANCE_TICK_BUDGET_MS,
+                 tick_seconds: float = MAINTENANCE_TICK_SECONDS):
+        self.db = db
+        self.budget = budget_ms / 1000
+        self.tick_seconds = tick_seconds
+        self.report: Optional[MaintenanceReport] = None
+        self._steps: Optional[Generator] = None
+        self._last_result = None
+
+    def _cycle(self) -> Generator[Tuple[str, Callable], object, None]:
+        """Шаги цикла: (поле отчета, вызов)
+        
+        Результат вызова прибавляется к полю отчета (список - своей длиной)
+        и возвращается в генератор через send().
+        """
+        yield 'purged', functools.partial(self.db.cleanup_old_bookings, AUTO_CLEANUP_DAYS)
+        yield 'archived', self.db.archive_past_bookings
+        # Список дней берем после архивации - прошедшие дни уже не в индексе
+        days = yield 'days_checked', self.db.index_days
+        for day in days or []:
+            yield 'repaired', functools.partial(self.db.verify_day_index, day)
+        yield 'repaired', self.db.verify_lookup_indexes
+        yield 'bytes_reclaimed', self.db.compact_storage
+
+    def schedule(self, job_queue):
+        """Зарегистрировать ежедневный запуск в JobQueue приложения"""
+        job_queue.run_daily(self.start_cycle, time=daily_time(MAINTENANCE_HOUR, tzinfo=BAKU_TZ),
+                            name=self.JOB_NAME)
+        logger.info(f"🛠 Обслуживание хранилища запланировано на {MAINTENANCE_HOUR:02d}:00 (Баку)")
+
+    async def start_cycle(self, context):
+        """Начать цикл обслуживания (если предыдущий еще идет - ничего не делаем)"""
+        if self._steps is not None:
+            logger.warning("⚠️ Предыдущий цикл обслуживания еще не завершен")
+            return
+        self.report = MaintenanceReport()
+        self._steps = self._cycle()
+        self._last_result = None
+        logger.info("🛠 Начат цикл обслуживания хранилища")
+        context.job_queue.run_repeating(self.tick, interval=self.tick_seconds, first=0,
+                                        name=f"{self.JOB_NAME}-tick")
+
+    async def tick(self, context):
+        """Выполнить шаги цикла в пределах бюджета времени"""
+        if self._steps is None:
+            context.job.schedule_removal()
+            return
+        deadline = time.monotonic() + self.budget
+        while time.monotonic() < deadline:
+            try:
+                field, step = self._steps.send(self._last_result)
+            except StopIteration:
+                self._steps = None
+                context.job.schedule_removal()
+                logger.info(f"🛠 Обслуживание завершено: {self.report.summary()}")
+                return
+            self._last_result = await self._run_step(field, step)
+
+    async def _run_step(self, field: str, step: Callable):
+        """Выполнить шаг в пуле потоков и учесть результат в отчете"""
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(None, step)
+        except Exception as e:
+            logger.error(f"❌ Ошибка шага обслуживания ({field}): {e}")
+            self.report.errors += 1
+            return None
+        amount = len(result) if isinstance(result, list) else int(result or 0)
+        setattr(self.report, field, getattr(self.report, field) + amount)
+        return result
@@ -0,0 +1,256 @@
+"""
+Записи бронирований в памяти
+Время хранится уже разобранным, JSON-словари появляются только на границе с хранилищем
+"""
+
+from datetime import date, datetime, timedelta
+from enum import Enum
+from typing import Dict, Iterator, Optional
+
+from config import DEFAULT_ROOM, ROOMS
+
+
+class BookingStatus(str, Enum):
+    """Статус брони (значение совпадает с тем, что пишется на диск)"""
+    ACTIVE = 'active'
+    CANCELLED = 'cancelled'
+
+
+class RecurrenceFreq(str, Enum):
+    """Частота повторения серии"""
+    DAILY = 'daily'
+    WEEKDAYS = 'weekdays'
+    WEEKLY = 'weekly'
+
+
+class Recurrence:
+    """Правило повторения серии (подмножество RRULE): частота, until/count, исключения
+
+    Серия хранится одной записью, вхождения вычисляются по правилу только для
+    запрошенного окна дат. Исключения - даты отмененных вхождений; как EXDATE
+    в RRULE, они учитываются в count.
+    """
+
+    __slots__ = ('freq', 'until', 'count', 'exceptions')
+
+    def __init__(self, freq: RecurrenceFreq, until: Optional[date] = None, count: Optional[int] = None,
+                 exceptions=None):
+        self.freq = RecurrenceFreq(freq)
+        self.until = until
+        self.count = count
+        self.exceptions = set(exceptions or ())
+
+    def index(self, first: date, day: date) -> Optional[int]:
+        """Номер вхождения серии, начатой в first, в день day (None - по правилу вхождения нет)"""
+        days = (day - first).days
+        if days < 0:
+            return None
+        if self.freq is RecurrenceFreq.DAILY:
+            return days
+        if self.freq is RecurrenceFreq.WEEKLY:
+            return days // 7 if days % 7 == 0 else None
+        if day.weekday() >= 5:
+            return None
+        weeks, rest = divmod(days, 7)
+        return weeks * 5 + sum(1 for i in range(rest) if (first.weekday() + i) % 7 < 5)
+
+    def occurs_on(self, first: date, day: date) -> bool:
+        """Есть ли вхождение в этот день (с учетом until, count и исключений)"""
+        index = self.index(first, day)
+        return (index is not None
+                and (self.count is None or index < self.count)
+                and (self.until is None or day <= self.until)
+                and day not in self.exceptions)
+
+    def last_day(self, first: date) -> Optional[date]:
+        """Последний возможный день серии или None, если серия бесконечна"""
+        last = self.until
+        if self.count is not None:
+            if self.freq is RecurrenceFreq.DAILY:
+                by_count = first + timedelta(days=self.count - 1)
+            elif self.freq is RecurrenceFreq.WEEKLY:
+                by_count = first + timedelta(weeks=self.count - 1)
+            else:
+                weeks, rest = divmod(self.count - 1, 5)
+                by_count = first + timedelta(weeks=weeks)
+                while rest:
+                    by_count += timedelta(days=1)
+                    if by_count.weekday() < 5:
+                        rest -= 1
+            last = by_count if last is None else min(last, by_count)
+        return last
+
+    def days(self, first: date, since: date, until: date) -> Iterator[date]:
+        """Дни вхождений в окне [since, until]"""
+        last = self.last_day(first)
+        if last is not None:
+            until = min(until, last)
+        day = max(first, since)
+        while day <= until:
+            if self.occurs_on(first, day):
+                yield day
+            day += timedelta(days=1)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Recurrence':
+        return cls(
+            freq=data['freq'],
+            until=date.fromisoformat(data['until']) if data.get('until') else None,
+            count=data.get('count'),
+            exceptions=[date.fromisoformat(day) for day in data.get('exceptions', [])],
+        )
+
+    def to_dict(self) -> Dict:
+        return {
+            'freq': self.freq.value,
+            'until': self.until.isoformat() if self.until is not None else None,
+            'count': self.count,
+            'exceptions': sorted(day.isoformat() for day in self.exceptions),
+        }
+
+    def copy(self) -> 'Recurrence':
+        return Recurrence(self.freq, self.until, self.count, self.exceptions)
+
+    def __eq__(self, other):
+        if not isinstance(other, Recurrence):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    __hash__ = None
+
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+def _format_time(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+
+class Booking:
+    """Бронь переговорной комнаты
+
+    Создается один раз при загрузке или при бронировании; start/end уже
+    datetime, поэтому индексы и отрисовка не разбирают ISO-строки заново.
+    Серия - бронь с правилом recurrence, где start/end - первое вхождение;
+    вхождения - обычные Booking с series_id серии, создаются по запросу.
+    """
+
+    __slots__ = ('id', 'user_id', 'user_name', 'start', 'end', 'description',
+                 'created_at', 'status', 'cancelled_at', 'room_id', 'recurrence', 'series_id')
+
+    def __init__(self, id: int, user_id: int, user_name: str, start: datetime, end: datetime,
+                 description: str, created_at: datetime,
+                 status: BookingStatus = BookingStatus.ACTIVE,
+                 cancelled_at: Optional[datetime] = None,
+                 room_id: str = DEFAULT_ROOM,
+                 recurrence: Optional[Recurrence] = None,
+                 series_id: Optional[int] = None):
+        self.id = id
+        self.user_id = user_id
+        self.user_name = user_name
+        self.start = start
+        self.end = end
+        self.description = description
+        self.created_at = created_at
+        self.status = status
+        self.cancelled_at = cancelled_at
+        self.room_id = room_id
+        self.recurrence = recurrence
+        self.series_id = series_id
+
+    @property
+    def is_active(self) -> bool:
+        return self.status is BookingStatus.ACTIVE
+
+    @property
+    def room_name(self) -> str:
+        """Название комнаты из настроек (для удаленной из настроек - ее ID)"""
+        return ROOMS.get(self.room_id, self.room_id)
+
+    @property
+    def is_series(self) -> bool:
+        """Запись серии (а не разовая бронь и не вхождение)"""
+        return self.recurrence is not None and self.series_id is None
+
+    @property
+    def last_end(self) -> Optional[datetime]:
+        """Конец последнего вхождения; None - серия бесконечна"""
+        if not self.is_series:
+            return self.end
+        last_day = self.recurrence.last_day(self.start.date())
+        if last_day is None:
+            return None
+        return datetime.combine(last_day, self.start.time()) + (self.end - self.start)
+
+    def occurrence_days(self, since: date, until: date) -> Iterator[date]:
+        """Дни вхождений серии в окне [since, until]"""
+        return self.recurrence.days(self.start.date(), since, until)
+
+    def next_occurrence(self, after: datetime, within_days: int = 366) -> Optional['Booking']:
+        """Ближайшее вхождение серии, начинающееся позже after"""
+        for day in self.occurrence_days(after.date(), after.date() + timedelta(days=within_days)):
+            occurrence = self.occurrence(day)
+            if occurrence.start > after:
+                return occurrence
+        return None
+
+    def occurrence(self, day: date) -> 'Booking':
+        """Вхождение серии в день day (правило не проверяется)"""
+        start = datetime.combine(day, self.start.time())
+        return Booking(self.id, self.user_id, self.user_name, start, start + (self.end - self.start),
+                       self.description, self.created_at, self.status, self.cancelled_at, self.room_id,
+                       self.recurrence, series_id=self.id)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Booking':
+        """Собрать бронь из записи хранилища"""
+        return cls(
+            id=data['id'],
+            user_id=data['user_id'],
+            user_name=data['user_name'],
+            start=datetime.fromisoformat(data['start_time']),
+            end=datetime.fromisoformat(data['end_time']),
+            description=data['description'],
+            created_at=_parse_time(data.get('created_at')),
+            status=BookingStatus(data.get('status', 'active')),
+            cancelled_at=_parse_time(data.get('cancelled_at')),
+            room_id=data.get('room_id') or DEFAULT_ROOM,
+            recurrence=Recurrence.from_dict(data['recurrence']) if data.get('recurrence') else None,
+        )
+
+    def to_dict(self) -> Dict:
+        """Запись для хранилища (формат bookings.json)"""
+        data = {
+            'id': self.id,
+            'user_id': self.user_id,
+            'user_name': self.user_name,
+            'start_time': self.start.isoformat(),
+            'end_time': self.end.isoformat(),
+            'description': self.description,
+            'created_at': _format_time(self.created_at),
+            'status': self.status.value,
+            'room_id': self.room_id,
+        }
+        if self.cancelled_at is not None:
+            data['cancelled_at'] = self.cancelled_at.isoformat()
+        if self.recurrence is not None:
+            data['recurrence'] = self.recurrence.to_dict()
+        return data
+
+    def copy(self) -> 'Booking':
+        """Независимая копия для отдачи за пределы Database"""
+        return Booking(self.id, self.user_id, self.user_name, self.start, self.end,
+                       self.description, self.created_at, self.status, self.cancelled_at, self.room_id,
+                       self.recurrence.copy() if self.recurrence is not None else None, self.series_id)
+
+    def __eq__(self, other):
+        if not isinstance(other, Booking):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return (f"Booking(id={self.id}, user_id={self.user_id}, room={self.room_id}, "
+                f"{self.start.isoformat()} - {self.end.isoformat()}, {self.status.value})")
@@ -0,0 +1,177 @@
+"""
+Напоминания о предстоящих встречах
+Куча времен срабатывания (обновляется при создании/отмене брони) и очередь
+исходящих сообщений с ограничением частоты по чатам
+"""
+
+import heapq
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from telegram.error import RetryAfter, TelegramError
+
+from config import (
+    REMINDER_MINUTES_BEFORE, REMINDER_GLOBAL_RATE, REMINDER_CHAT_INTERVAL, REMINDER_GROUP_INTERVAL,
+)
+from models import Booking
+
+logger = logging.getLogger(__name__)
+
+
+class ReminderQueue:
+    """Минимальная куча (время напоминания, (ID брони, начало))
+
+    Отмена не ищет запись в куче: бронь просто убирается из словаря живых
+    напоминаний, а устаревшие элементы кучи пропускаются при извлечении.
+    Ключ включает начало, потому что у вхождений одной серии общий ID;
+    вхождения попадают в очередь не дальше LOOKAHEAD_DAYS вперед (см. extend).
+    Методы вызываются из потоков пула Database, поэтому под своей блокировкой.
+    """
+
+    LOOKAHEAD_DAYS = 2
+
+    def __init__(self, lead_minutes: int = REMINDER_MINUTES_BEFORE):
+        self.lead = timedelta(minutes=lead_minutes)
+        self.lock = threading.Lock()
+        self._heap: List[Tuple[datetime, Tuple[int, datetime]]] = []
+        self._entries: Dict[Tuple[int, datetime], Tuple[datetime, Booking]] = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def rebuild(self, bookings: List[Booking], now: datetime):
+        """Заполнить очередь заново (при старте) будущими активными бронями и вхождениями"""
+        with self.lock:
+            self._entries = {(b.id, b.start): (b.start - self.lead, b)
+                             for b in bookings if b.is_active and not b.is_series and b.start > now}
+            self._heap = [(fire_at, key) for key, (fire_at, _) in self._entries.items()]
+            heapq.heapify(self._heap)
+        logger.info(f"⏰ Напоминаний в очереди: {len(self._entries)}")
+
+    def extend(self, bookings: List[Booking], now: datetime):
+        """Добавить новые вхождения (напоминания, время которых еще не наступило)"""
+        for booking in bookings:
+            if booking.is_active and not booking.is_series and booking.start - self.lead > now:
+                with self.lock:
+                    if (booking.id, booking.start) in self._entries:
+                        continue
+                self.add(booking)
+
+    def add(self, booking: Booking):
+        fire_at = booking.start - self.lead
+        key = (booking.id, booking.start)
+        with self.lock:
+            self._entries[key] = (fire_at, booking)
+            heapq.heappush(self._heap, (fire_at, key))
+
+    def remove(self, booking_id: int, start: Optional[datetime] = None):
+        """Убрать напоминание брони (start=None - все вхождения серии)"""
+        with self.lock:
+            if start is not None:
+                self._entries.pop((booking_id, start), None)
+            else:
+                for key in [key for key in self._entries if key[0] == booking_id]:
+                    del self._entries[key]
+            # Если устаревших элементов стало слишком много - пересобираем кучу
+            if len(self._heap) > 2 * len(self._entries) + 64:
+                self._heap = [(fire_at, key) for key, (fire_at, _) in self._entries.items()]
+                heapq.heapify(self._heap)
+
+    def on_booking_event(self, event: str, booking: Booking):
+        """Слушатель Database: бронь или серия создана/отменена, вхождение серии отменено"""
+        if event == 'created':
+            if booking.is_series:
+                today = booking.created_at.date() if booking.created_at else booking.start.date()
+                for day in booking.occurrence_days(today, today + timedelta(days=self.LOOKAHEAD_DAYS)):
+                    self.add(booking.occurrence(day))
+            else:
+                self.add(booking)
+        elif event == 'cancelled':
+            self.remove(booking.id)
+        elif event == 'skipped':
+            self.remove(booking.id, booking.start)
+
+    def pop_due(self, now: datetime) -> List[Booking]:
+        """Извлечь брони, напоминание о которых пора отправить (уже начавшиеся пропускаются)"""
+        due = []
+        with self.lock:
+            while self._heap and self._heap[0][0] <= now:
+                fire_at, key = heapq.heappop(self._heap)
+                entry = self._entries.get(key)
+                if entry is None or entry[0] != fire_at:
+                    continue  # бронь отменена или напоминание перенесено
+                del self._entries[key]
+                if entry[1].start > now:
+                    due.append(entry[1])
+        return due
+
+
+class Outbox:
+    """Исходящие сообщения с ограничением частоты
+
+    Не больше global_rate сообщений в секунду всего и не чаще одного
+    сообщения в chat_interval (в группы - group_interval) секунд в чат.
+    Что не поместилось в лимиты, остается в очереди до следующего flush.
+    """
+
+    def __init__(self, global_rate: int = REMINDER_GLOBAL_RATE,
+                 chat_interval: float = REMINDER_CHAT_INTERVAL,
+                 group_interval: float = REMINDER_GROUP_INTERVAL):
+        self.global_rate = global_rate
+        self.chat_interval = chat_interval
+        self.group_interval = group_interval
+        self._queues: "OrderedDict[int, deque]" = OrderedDict()
+        self._next_allowed: Dict[int, float] = {}
+        self._tokens = float(global_rate)
+        self._refilled_at = time.monotonic()
+
+    def __len__(self):
+        return sum(len(queue) for queue in self._queues.values())
+
+    def put(self, chat_id: int, text: str):
+        self._queues.setdefault(chat_id, deque()).append(text)
+
+    def _take_token(self, now: float) -> bool:
+        self._tokens = min(self.global_rate, self._tokens + (now - self._refilled_at) * self.global_rate)
+        self._refilled_at = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    async def flush(self, bot) -> int:
+        """Отправить то, что разрешают лимиты; возвращает число отправленных сообщений"""
+        sent = 0
+        for chat_id in list(self._queues):
+            now = time.monotonic()
+            if self._next_allowed.get(chat_id, 0) > now:
+                continue
+            if not self._take_token(now):
+                break
+            queue = self._queues[chat_id]
+            try:
+                await bot.send_message(chat_id=chat_id, text=queue[0], parse_mode='HTML')
+                sent += 1
+            except RetryAfter as e:
+                delay = e.retry_after
+                delay = delay.total_seconds() if isinstance(delay, timedelta) else float(delay)
+                logger.warning(f"⚠️ Лимит Telegram для чата {chat_id}, повтор через {delay:.0f} с")
+                self._next_allowed[chat_id] = now + delay
+                continue
+            except TelegramError as e:
+                # Пользователь заблокировал бота, чат удален и т.п. - не повторяем
+                logger.error(f"❌ Напоминание в чат {chat_id} не отправлено: {e}")
+            queue.popleft()
+            if not queue:
+                del self._queues[chat_id]
+            self._next_allowed[chat_id] = now + (self.group_interval if chat_id < 0 else self.chat_interval)
+
+        # Забываем чаты без очереди, для которых пауза уже прошла
+        now = time.monotonic()
+        for chat_id in [c for c, t in self._next_allowed.items() if t <= now and c not in self._queues]:
+            del self._next_allowed[chat_id]
+        return sent
@@ -0,0 +1,582 @@
+"""
+Бэкенды хранения бронирований
+JSON-файлы (полная перезапись), журнал (дозапись одной строки на изменение) и SQLite
+
+Все бэкенды получают изменения в виде записей журнала:
+  {'op': 'create', 'booking': {...}}
+  {'op': 'cancel', 'id': ..., 'cancelled_at': ...}
+  {'op': 'purge', 'ids': [...]}
+  {'op': 'skip', 'id': ..., 'date': 'YYYY-MM-DD'}  - исключение (отмененное вхождение) серии
+и функцию snapshot(), возвращающую копию (bookings, next_id) - она нужна
+только бэкендам, которые переписывают состояние целиком. Снимок строится из
+подтвержденного (записанного) состояния плюс текущая пачка: изменения,
+которые еще ждут записи или будут откачены, в него не попадают. maintain(snapshot)
+освобождает место (свертка журнала, checkpoint WAL) и возвращает число
+освобожденных байт; вызывается только из потока записи GroupCommitter.
+"""
+
+import functools
+import gzip
+import json
+import os
+import logging
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Dict, Optional, Tuple
+
+from config import JOURNAL_COMPACT_EVERY, DATABASE_NAME, DURABLE_WRITES
+
+logger = logging.getLogger(__name__)
+
+
+class StorageCorruptedError(Exception):
+    """Файл данных существует, но не читается - пустые данные вместо него не возвращаем"""
+
+
+def read_json_file(filepath: str, default):
+    """Прочитать JSON файл; default только если файла нет
+    
+    Поврежденный файл (например, обрезанный при падении старой версии) вызывает
+    StorageCorruptedError: молча вернуть [] означало бы стереть все брони
+    при следующей записи. Файлы *.gz читаются как сжатые.
+    """
+    if not os.path.exists(filepath):
+        return default
+    opener = gzip.open if filepath.endswith('.gz') else open
+    try:
+        with opener(filepath, 'rt', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, EOFError, ValueError) as e:
+        logger.error(f"❌ Файл данных поврежден или не читается {filepath}: {e}")
+        raise StorageCorruptedError(f"{filepath}: {e}") from e
+
+
+def fsync_directory(dirpath: str):
+    """Сбросить на диск запись каталога (rename), где это поддерживается"""
+    if not hasattr(os, 'O_DIRECTORY'):
+        return  # Windows: каталоги так не открыть
+    fd = os.open(dirpath, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_json_file(filepath: str, data, durable: bool = False):
+    """Атомарно записать JSON файл: временный файл рядом, fsync, rename
+    
+    При падении посреди записи на диске остается либо старая, либо новая
+    версия файла целиком. durable=True дополнительно сбрасывает каталог,
+    чтобы сам rename пережил потерю питания. Файлы *.gz пишутся сжатыми.
+    Ошибки пробрасываются.
+    """
+    dirpath = os.path.dirname(filepath) or '.'
+    os.makedirs(dirpath, exist_ok=True)
+    compressed = filepath.endswith('.gz')
+    payload = json.dumps(data, ensure_ascii=False, indent=None if compressed else 2).encode('utf-8')
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(filepath) + '.', suffix='.tmp', dir=dirpath)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            if compressed:
+                with gzip.GzipFile(filename='', mode='wb', fileobj=f) as gz:
+                    gz.write(payload)
+            else:
+                f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    if durable:
+        fsync_directory(dirpath)
+
+
+def copy_record(record: Dict) -> Dict:
+    """Копия записи брони, изменения которой не затрагивают оригинал"""
+    record = dict(record)
+    if record.get('recurrence'):
+        record['recurrence'] = dict(record['recurrence'],
+                                    exceptions=list(record['recurrence'].get('exceptions', [])))
+    return record
+
+
+def apply_mutation(bookings: List[Dict], by_id: Dict[int, Dict], mutation: Dict):
+    """Применить одну запись журнала к списку броней (replay и подтвержденное состояние)"""
+    op = mutation.get('op')
+    if op == 'create':
+        booking = copy_record(mutation['booking'])
+        if booking['id'] in by_id:
+            # Запись уже попала в снимок (падение между снимком и очисткой журнала)
+            return
+        bookings.append(booking)
+        by_id[booking['id']] = booking
+    elif op == 'cancel':
+        booking = by_id.get(mutation['id'])
+        if booking is not None:
+            booking['status'] = 'cancelled'
+            booking['cancelled_at'] = mutation.get('cancelled_at')
+    elif op == 'purge':
+        purged = set(mutation['ids'])
+        bookings[:] = [b for b in bookings if b['id'] not in purged]
+        for booking_id in purged:
+            by_id.pop(booking_id, None)
+    elif op == 'skip':
+        booking = by_id.get(mutation['id'])
+        if booking is not None and booking.get('recurrence'):
+            exceptions = booking['recurrence'].setdefault('exceptions', [])
+            if mutation['date'] not in exceptions:
+                exceptions.append(mutation['date'])
+    else:
+        logger.warning(f"Неизвестная операция в журнале: {op}")
+
+
+class JsonStorage:
+    """Хранение в bookings.json + booking_id.json (каждое изменение переписывает файл)"""
+
+    def __init__(self, data_dir: str, durable: bool = False):
+        self.bookings_file = os.path.join(data_dir, "bookings.json")
+        self.booking_id_file = os.path.join(data_dir, "booking_id.json")
+        self.durable = durable
+
+    def init(self):
+        """Создать файлы, если их нет"""
+        if not os.path.exists(self.bookings_file):
+            write_json_file(self.bookings_file, [])
+            logger.info(f"✅ Создан файл бронирований: {self.bookings_file}")
+
+        if not os.path.exists(self.booking_id_file):
+            write_json_file(self.booking_id_file, {"next_id": 1})
+            logger.info(f"✅ Создан счетчик ID: {self.booking_id_file}")
+
+    def load(self) -> Tuple[List[Dict], int]:
+        """Загрузить брони и следующий ID"""
+        bookings = read_json_file(self.bookings_file, [])
+        next_id = read_json_file(self.booking_id_file, {}).get('next_id', 1)
+        # Счетчик мог отстать от броней (старые версии писали его вторым файлом) -
+        # ID существующих броней не выдаем повторно
+        next_id = max([next_id] + [b['id'] + 1 for b in bookings])
+        return bookings, next_id
+
+    def close(self):
+        pass
+
+    def commit(self, mutations: List[Dict], snapshot: Callable):
+        """Сохранить изменения: JSON-хранилище всегда переписывает файлы целиком"""
+        bookings, next_id = snapshot()
+        # Сначала счетчик: при падении между записями он опережает брони (пропуск ID),
+        # а не отстает от них (повтор ID)
+        if any(m['op'] == 'create' for m in mutations):
+            write_json_file(self.booking_id_file, {'next_id': next_id}, durable=self.durable)
+        write_json_file(self.bookings_file, bookings, durable=self.durable)
+
+    def maintain(self, snapshot: Callable) -> int:
+        """Файлы переписываются целиком при каждом изменении - освобождать нечего"""
+        return 0
+
+
+class JournalStorage:
+    """Журнальное хранение: снимок + дозапись одной JSON-строки на изменение
+
+    При старте состояние восстанавливается из снимка и повтора журнала.
+    Когда журнал вырастает до compact_every записей, он сворачивается в новый снимок.
+    """
+
+    def __init__(self, data_dir: str, compact_every: int = 500, durable: bool = False):
+        self.data_dir = data_dir
+        self.durable = durable
+        self.snapshot_file = os.path.join(data_dir, "bookings.snapshot.json")
+        self.journal_file = os.path.join(data_dir, "bookings.journal")
+        self.compact_every = compact_every
+        self._journal_entries = 0
+
+    def init(self):
+        """Создать снимок; при первом запуске перенести данные из JSON-хранилища"""
+        if os.path.exists(self.snapshot_file):
+            return
+
+        legacy = JsonStorage(self.data_dir)
+        if os.path.exists(legacy.bookings_file):
+            bookings, next_id = legacy.load()
+            logger.info(f"📦 Миграция {len(bookings)} броней из {legacy.bookings_file} в журнал")
+        else:
+            bookings, next_id = [], 1
+
+        write_json_file(self.snapshot_file, {'next_id': next_id, 'bookings': bookings}, durable=self.durable)
+        logger.info(f"✅ Создан снимок бронирований: {self.snapshot_file}")
+
+    def load(self) -> Tuple[List[Dict], int]:
+        """Загрузить снимок и повторить журнал"""
+        snapshot = read_json_file(self.snapshot_file, {})
+        bookings = snapshot.get('bookings', [])
+        next_id = snapshot.get('next_id', 1)
+        by_id = {b['id']: b for b in bookings}
+
+        self._journal_entries = 0
+        if os.path.exists(self.journal_file):
+            good_offset = 0
+            with open(self.journal_file, 'rb') as f:
+                for line_no, raw in enumerate(f, 1):
+                    if not raw.endswith(b'\n'):
+                        # Незавершенной может быть только последняя строка - оборванная при падении процесса
+                        logger.warning(f"⚠️ Оборванная последняя строка журнала #{line_no} отброшена")
+                        break
+                    try:
+                        mutation = json.loads(raw.decode('utf-8'))
+                    except ValueError as e:
+                        # Испорченная строка посреди журнала: отбросить ее и все после нее значило бы
+                        # молча потерять подтвержденные изменения
+                        logger.error(f"❌ Поврежденная строка журнала #{line_no}: {e}")
+                        raise StorageCorruptedError(f"{self.journal_file}, строка {line_no}: {e}") from e
+                    good_offset += len(raw)
+                    apply_mutation(bookings, by_id, mutation)
+                    if mutation.get('op') == 'create':
+                        next_id = max(next_id, mutation['booking']['id'] + 1)
+                    self._journal_entries += 1
+
+            # Обрезаем оборванный хвост, чтобы следующие записи не склеились с ним
+            if os.path.getsize(self.journal_file) > good_offset:
+                with open(self.journal_file, 'r+b') as f:
+                    f.truncate(good_offset)
+
+        logger.info(f"📜 Повторено записей журнала: {self._journal_entries}")
+        return bookings, next_id
+
+    def commit(self, mutations: List[Dict], snapshot: Callable):
+        """Дописать изменения в журнал"""
+        payload = ''.join(json.dumps(m, ensure_ascii=False) + '\n' for m in mutations).encode('utf-8')
+        offset = os.path.getsize(self.journal_file) if os.path.exists(self.journal_file) else 0
+        try:
+            with open(self.journal_file, 'ab') as f:
+                f.write(payload)
+                if self.durable:
+                    f.flush()
+                    os.fsync(f.fileno())
+        except BaseException:
+            # Недописанная пачка (например, диск заполнен) не должна склеиться со следующей записью
+            try:
+                with open(self.journal_file, 'r+b') as f:
+                    f.truncate(offset)
+            except OSError as e:
+                logger.error(f"❌ Не удалось обрезать недописанную пачку журнала: {e}")
+            raise
+        self._journal_entries += len(mutations)
+
+        if self._journal_entries >= self.compact_every:
+            # Изменения уже в журнале: ошибка свертки не должна откатывать пачку
+            try:
+                self.compact(*snapshot())
+            except OSError as e:
+                logger.error(f"❌ Ошибка свертки журнала (повторим позже): {e}")
+
+    def close(self):
+        pass
+
+    def maintain(self, snapshot: Callable) -> int:
+        """Свернуть журнал, если в нем есть записи"""
+        if not self._journal_entries:
+            return 0
+        size = os.path.getsize(self.journal_file) if os.path.exists(self.journal_file) else 0
+        self.compact(*snapshot())
+        return size
+
+    def compact(self, bookings: List[Dict], next_id: int):
+        """Свернуть журнал в новый снимок"""
+        # Сначала атомарно пишем снимок, затем очищаем журнал: при падении между
+        # шагами повтор журнала идемпотентен (см. apply_mutation)
+        write_json_file(self.snapshot_file, {'next_id': next_id, 'bookings': bookings}, durable=self.durable)
+        with open(self.journal_file, 'w', encoding='utf-8') as f:
+            if self.durable:
+                os.fsync(f.fileno())
+        logger.info(f"🗜 Журнал свернут в снимок ({self._journal_entries} записей)")
+        self._journal_entries = 0
+
+
+class SqliteStorage:
+    """Хранение в SQLite (WAL, индексы по (status, start_time), (room_id, start_time) и user_id)
+
+    ID выдается столбцом AUTOINCREMENT вместо отдельного файла-счетчика.
+    Правило серии хранится JSON в столбце recurrence, исключения серий -
+    строками таблицы booking_exceptions (отмена вхождения не трогает серию).
+    Все запросы - заранее подготовленные параметризованные выражения.
+    """
+
+    COLUMNS = ('id', 'user_id', 'user_name', 'start_time', 'end_time',
+               'description', 'created_at', 'status', 'cancelled_at', 'room_id', 'recurrence')
+
+    SQL_SCHEMA = """
+        CREATE TABLE IF NOT EXISTS bookings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            user_name TEXT,
+            start_time TEXT NOT NULL,
+            end_time TEXT NOT NULL,
+            description TEXT,
+            created_at TEXT,
+            status TEXT NOT NULL DEFAULT 'active',
+            cancelled_at TEXT,
+            room_id TEXT,
+            recurrence TEXT
+        );
+        CREATE TABLE IF NOT EXISTS booking_exceptions (
+            booking_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            PRIMARY KEY (booking_id, day)
+        );
+        CREATE INDEX IF NOT EXISTS idx_bookings_status_start ON bookings (status, start_time);
+        CREATE INDEX IF NOT EXISTS idx_bookings_user ON bookings (user_id);
+    """
+    # Столбцы, добавленные после первой версии схемы: для старых баз - ALTER TABLE
+    SQL_ADDED_COLUMNS = {
+        'room_id': "ALTER TABLE bookings ADD COLUMN room_id TEXT",
+        'recurrence': "ALTER TABLE bookings ADD COLUMN recurrence TEXT",
+    }
+    SQL_ROOM_INDEX = "CREATE INDEX IF NOT EXISTS idx_bookings_room_start ON bookings (room_id, start_time)"
+    SQL_SELECT_ALL = "SELECT id, user_id, user_name, start_time, end_time, description, created_at, status, cancelled_at, room_id, recurrence FROM bookings ORDER BY id"
+    SQL_SELECT_EXCEPTIONS = "SELECT booking_id, day FROM booking_exceptions ORDER BY booking_id, day"
+    SQL_NEXT_ID = "SELECT seq FROM sqlite_sequence WHERE name = 'bookings'"
+    SQL_SEED_ID = "UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'bookings'"
+    SQL_INSERT_SEQ = "INSERT INTO sqlite_sequence (name, seq) VALUES ('bookings', ?)"
+    SQL_INSERT = (
+        "INSERT INTO bookings (id, user_id, user_name, start_time, end_time, description, created_at, status, cancelled_at, room_id, recurrence) "
+        "VALUES (:id, :user_id, :user_name, :start_time, :end_time, :description, :created_at, :status, :cancelled_at, :room_id, :recurrence)"
+    )
+    SQL_INSERT_EXCEPTION = "INSERT OR IGNORE INTO booking_exceptions (booking_id, day) VALUES (?, ?)"
+    SQL_DELETE_EXCEPTIONS = "DELETE FROM booking_exceptions WHERE booking_id = ?"
+    SQL_CANCEL = "UPDATE bookings SET status = 'cancelled', cancelled_at = ? WHERE id = ?"
+    SQL_DELETE = "DELETE FROM bookings WHERE id = ?"
+    SQL_COUNT = "SELECT COUNT(*) FROM bookings"
+
+    def __init__(self, data_dir: str, filename: str = DATABASE_NAME, durable: bool = False):
+        self.data_dir = data_dir
+        self.durable = durable
+        self.db_file = os.path.join(data_dir, filename)
+        self.conn = None
+
+    def init(self):
+        """Открыть базу, создать схему; при первом запуске перенести данные из JSON"""
+        # Доступ всегда идет под блокировкой Database, поэтому соединение общее для потоков
+        self.conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # FULL - fsync на каждом коммите; NORMAL в WAL не повреждает базу, но может потерять последний коммит
+        self.conn.execute(f"PRAGMA synchronous={'FULL' if self.durable else 'NORMAL'}")
+        self.conn.executescript(self.SQL_SCHEMA)
+        # Базы старых версий: брони без комнаты относятся к основной, без правила - разовые
+        columns = {row['name'] for row in self.conn.execute("PRAGMA table_info(bookings)")}
+        for column, sql in self.SQL_ADDED_COLUMNS.items():
+            if column not in columns:
+                with self.conn:
+                    self.conn.execute(sql)
+                logger.info(f"📦 В таблицу bookings добавлен столбец {column}")
+        self.conn.execute(self.SQL_ROOM_INDEX)
+
+        if self.conn.execute(self.SQL_COUNT).fetchone()[0] == 0:
+            legacy = JsonStorage(self.data_dir)
+            if os.path.exists(legacy.bookings_file):
+                bookings, next_id = legacy.load()
+                with self.conn:
+                    for booking in bookings:
+                        self._insert(booking)
+                    # Счетчик из booking_id.json: ID удаленных броней не выдаются повторно,
+                    # иначе старые кнопки cancel_<id> указали бы на новые брони
+                    if self.conn.execute(self.SQL_SEED_ID, (next_id - 1,)).rowcount == 0:
+                        self.conn.execute(self.SQL_INSERT_SEQ, (next_id - 1,))
+                logger.info(f"📦 Миграция {len(bookings)} броней из {legacy.bookings_file} в {self.db_file}")
+
+    def _row(self, booking: Dict) -> Dict:
+        row = {column: booking.get(column) for column in self.COLUMNS}
+        if row['recurrence']:
+            rule = {key: value for key, value in row['recurrence'].items() if key != 'exceptions'}
+            row['recurrence'] = json.dumps(rule)
+        return row
+
+    def _insert(self, booking: Dict):
+        """Вставить бронь (и исключения серии) - внутри открытой транзакции"""
+        self.conn.execute(self.SQL_INSERT, self._row(booking))
+        if booking.get('recurrence'):
+            self.conn.executemany(self.SQL_INSERT_EXCEPTION,
+                                  [(booking['id'], day) for day in booking['recurrence'].get('exceptions', [])])
+
+    def load(self) -> Tuple[List[Dict], int]:
+        """Загрузить брони и следующий ID"""
+        exceptions: Dict[int, List[str]] = {}
+        for booking_id, day in self.conn.execute(self.SQL_SELECT_EXCEPTIONS):
+            exceptions.setdefault(booking_id, []).append(day)
+
+        bookings = []
+        for row in self.conn.execute(self.SQL_SELECT_ALL):
+            booking = dict(row)
+            if booking['cancelled_at'] is None:
+                del booking['cancelled_at']
+            if booking['recurrence']:
+                booking['recurrence'] = dict(json.loads(booking['recurrence']),
+                                             exceptions=exceptions.get(booking['id'], []))
+            else:
+                del booking['recurrence']
+            bookings.append(booking)
+        seq = self.conn.execute(self.SQL_NEXT_ID).fetchone()
+        return bookings, (seq[0] if seq else 0) + 1
+
+    def commit(self, mutations: List[Dict], snapshot: Callable):
+        """Применить изменения одной транзакцией"""
+        with self.conn:
+            for mutation in mutations:
+                op = mutation['op']
+                if op == 'create':
+                    self._insert(mutation['booking'])
+                elif op == 'cancel':
+                    self.conn.execute(self.SQL_CANCEL, (mutation['cancelled_at'], mutation['id']))
+                elif op == 'purge':
+                    self.conn.executemany(self.SQL_DELETE, [(i,) for i in mutation['ids']])
+                    self.conn.executemany(self.SQL_DELETE_EXCEPTIONS, [(i,) for i in mutation['ids']])
+                elif op == 'skip':
+                    self.conn.execute(self.SQL_INSERT_EXCEPTION, (mutation['id'], mutation['date']))
+
+    def maintain(self, snapshot: Callable) -> int:
+        """Перенести WAL в основной файл базы и обрезать его"""
+        wal_file = self.db_file + '-wal'
+        before = os.path.getsize(wal_file) if os.path.exists(wal_file) else 0
+        self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        after = os.path.getsize(wal_file) if os.path.exists(wal_file) else 0
+        return max(before - after, 0)
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+class GroupCommitter:
+    """Групповая фиксация: изменения копятся window_ms и пишутся одной записью
+
+    Вызывающий поток получает Future и ждет его - подтверждение приходит
+    только после того, как изменение сохранено. Если запись пачки не удалась,
+    под блокировкой хранилища выполняются откаты всех ее изменений
+    (в обратном порядке), а каждый Future получает исключение.
+    Обслуживание бэкенда (maintain) выполняется в том же потоке между
+    пачками, поэтому никогда не пересекается с записью.
+
+    Снимки для бэкендов строятся из копии подтвержденного состояния, которую
+    ведет поток записи: изменения в памяти, ждущие следующей пачки, на диск
+    через снимок не попадают и не переживут свой откат.
+    """
+
+    def __init__(self, storage, snapshot: Callable, lock, window_ms: int = 50):
+        """snapshot() - начальное (уже записанное) состояние (bookings, next_id)"""
+        self.storage = storage
+        self.lock = lock
+        self._committed, self._committed_next_id = snapshot()
+        self._committed_by_id = {b['id']: b for b in self._committed}
+        self.window = window_ms / 1000
+        self._pending: List[Tuple[List[Dict], Optional[Callable], Future]] = []
+        self._maintenance: List[Future] = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+        self._thread.start()
+
+    def submit(self, mutations: List[Dict], rollback: Optional[Callable] = None) -> Future:
+        """Поставить изменения в очередь; rollback отменяет их в памяти при ошибке записи"""
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Хранилище закрыто")
+            self._pending.append((mutations, rollback, future))
+            self._cond.notify()
+        return future
+
+    def maintain(self) -> Future:
+        """Запросить обслуживание бэкенда; Future получит число освобожденных байт"""
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Хранилище закрыто")
+            self._maintenance.append(future)
+            self._cond.notify()
+        return future
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._maintenance and not self._closed:
+                    self._cond.wait()
+                if not self._pending and not self._maintenance:
+                    return
+                closing = self._closed
+                has_batch = bool(self._pending)
+            if has_batch and self.window and not closing:
+                # Окно сбора: изменения, пришедшие за это время, уйдут одной записью
+                time.sleep(self.window)
+            with self._cond:
+                batch, self._pending = self._pending, []
+                tasks, self._maintenance = self._maintenance, []
+            if batch:
+                self._flush(batch)
+            for future in tasks:
+                try:
+                    future.set_result(self.storage.maintain(functools.partial(self._snapshot_with, [])))
+                except Exception as e:
+                    logger.error(f"❌ Ошибка обслуживания хранилища: {e}")
+                    future.set_exception(e)
+
+    def _snapshot_with(self, mutations: List[Dict]) -> Tuple[List[Dict], int]:
+        """Копия подтвержденного состояния с примененными mutations"""
+        bookings = [copy_record(b) for b in self._committed]
+        by_id = {b['id']: b for b in bookings}
+        next_id = self._committed_next_id
+        for mutation in mutations:
+            apply_mutation(bookings, by_id, mutation)
+            if mutation['op'] == 'create':
+                next_id = max(next_id, mutation['booking']['id'] + 1)
+        return bookings, next_id
+
+    def _apply_committed(self, mutations: List[Dict]):
+        """Учесть записанную пачку в подтвержденном состоянии"""
+        for mutation in mutations:
+            apply_mutation(self._committed, self._committed_by_id, mutation)
+            if mutation['op'] == 'create':
+                self._committed_next_id = max(self._committed_next_id, mutation['booking']['id'] + 1)
+
+    def _flush(self, batch):
+        mutations = [mutation for item in batch for mutation in item[0]]
+        try:
+            self.storage.commit(mutations, functools.partial(self._snapshot_with, mutations))
+        except Exception as e:
+            logger.error(f"❌ Ошибка записи пачки из {len(mutations)} изменений: {e}")
+            with self.lock:
+                for _, rollback, _ in reversed(batch):
+                    if rollback is not None:
+                        rollback()
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        self._apply_committed(mutations)
+        if len(batch) > 1:
+            logger.info(f"💾 Записано одной пачкой изменений: {len(mutations)}")
+        for _, _, future in batch:
+            future.set_result(None)
+
+    def close(self):
+        """Записать оставшиеся изменения и остановить поток"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+
+def create_storage(backend: str, data_dir: str):
+    """Создать бэкенд хранения по имени из конфигурации"""
+    if backend == 'json':
+        return JsonStorage(data_dir, durable=DURABLE_WRITES)
+    if backend == 'journal':
+        return JournalStorage(data_dir, compact_every=JOURNAL_COMPACT_EVERY, durable=DURABLE_WRITES)
+    if backend == 'sqlite':
+        return SqliteStorage(data_dir, durable=DURABLE_WRITES)
+    raise ValueError(f"Неизвестный бэкенд хранения: {backend}")
@@ -0,0 +1,98 @@
+"""
+Параллельные записи не портят хранилище
+Несколько потоков одновременно создают и отменяют брони в одном каталоге данных;
+после этого файлы читаются, ID уникальны, а повторная загрузка видит те же брони без пересечений
+"""
+
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database, now_baku  # noqa: E402
+
+THREADS = 8
+OPERATIONS = 25
+
+
+class ConcurrentWritersTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp(prefix="meeting-room-test-")
+        self.day = (now_baku() + timedelta(days=1)).date()
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def _writer(self, db: Database, user_id: int, errors: list):
+        rng = random.Random(user_id)
+        created = []
+        try:
+            for _ in range(OPERATIONS):
+                if created and rng.random() < 0.3:
+                    self.assertTrue(db.cancel_booking(created.pop(rng.randrange(len(created))), user_id))
+                    continue
+                # 08:00-19:30 с шагом 30 минут - потоки часто целятся в одни и те же слоты
+                start = f"{self.day.isoformat()}T{8 + rng.randrange(12):02d}:{rng.choice((0, 30)):02d}"
+                end = (datetime.fromisoformat(start) + timedelta(minutes=rng.choice((30, 60, 90)))).isoformat()
+                result = db.try_create_booking(user_id, f"user {user_id}", start, end, "test")
+                self.assertIn(result.status, ('created', 'conflict'))
+                if result.status == 'created':
+                    created.append(result.booking.id)
+        except Exception as e:  # ошибку потока передаем в основной поток
+            errors.append(e)
+
+    def _run_writers(self, backend: str):
+        db = Database(self.data_dir, backend)
+        errors = []
+        threads = [threading.Thread(target=self._writer, args=(db, user_id, errors))
+                   for user_id in range(1, THREADS + 1)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        active = {(b.id, b.user_id, b.start, b.end) for b in db.get_all_bookings()}
+        ids = [b.id for b in db._bookings]
+        db.close()
+        return active, ids
+
+    def _check_backend(self, backend: str):
+        active, ids = self._run_writers(backend)
+        self.assertEqual(len(ids), len(set(ids)), "ID броней повторяются")
+
+        if backend == 'json':
+            with open(os.path.join(self.data_dir, "bookings.json"), encoding='utf-8') as f:
+                records = json.load(f)
+            self.assertEqual(sorted(r['id'] for r in records), sorted(ids))
+
+        reloaded = Database(self.data_dir, backend)
+        try:
+            loaded = reloaded.get_all_bookings()
+            self.assertEqual({(b.id, b.user_id, b.start, b.end) for b in loaded}, active)
+            loaded.sort(key=lambda b: b.start)
+            for previous, booking in zip(loaded, loaded[1:]):
+                self.assertLessEqual(previous.end, booking.start,
+                                     f"брони #{previous.id} и #{booking.id} пересекаются")
+        finally:
+            reloaded.close()
+
+    def test_json(self):
+        self._check_backend('json')
+
+    def test_journal(self):
+        self._check_backend('journal')
+
+    def test_sqlite(self):
+        self._check_backend('sqlite')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+"""
+Регулярные брони: правило повторения, раскрытие вхождений и пересечения серий
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database, now_baku  # noqa: E402
+from models import Recurrence, RecurrenceFreq  # noqa: E402
+
+
+def next_monday() -> date:
+    today = now_baku().date()
+    return today + timedelta(days=7 - today.weekday())
+
+
+class RecurrenceRuleTest(unittest.TestCase):
+
+    def test_weekdays_count_skips_weekends(self):
+        thursday = date(2030, 1, 3)
+        rule = Recurrence(RecurrenceFreq.WEEKDAYS, count=6)
+        days = list(rule.days(thursday, thursday, thursday + timedelta(weeks=4)))
+        self.assertEqual([d.isoformat() for d in days],
+                         ['2030-01-03', '2030-01-04', '2030-01-07', '2030-01-08', '2030-01-09', '2030-01-10'])
+        self.assertEqual(rule.last_day(thursday), days[-1])
+
+    def test_weekly_until_and_exceptions(self):
+        monday = date(2030, 1, 7)
+        rule = Recurrence('weekly', until=date(2030, 1, 28), exceptions=[date(2030, 1, 14)])
+        self.assertEqual(list(rule.days(monday, monday, date(2030, 3, 1))),
+                         [date(2030, 1, 7), date(2030, 1, 21), date(2030, 1, 28)])
+        self.assertFalse(rule.occurs_on(monday, date(2030, 1, 8)))
+        # Исключение учитывается в count, как EXDATE в RRULE
+        counted = Recurrence('weekly', count=3, exceptions=[date(2030, 1, 14)])
+        self.assertEqual(counted.last_day(monday), date(2030, 1, 21))
+        self.assertEqual(len(list(counted.days(monday, monday, date(2030, 3, 1)))), 2)
+
+    def test_dict_round_trip(self):
+        rule = Recurrence('daily', until=date(2030, 2, 1), exceptions=[date(2030, 1, 9), date(2030, 1, 8)])
+        data = rule.to_dict()
+        self.assertEqual(data['exceptions'], ['2030-01-08', '2030-01-09'])
+        self.assertEqual(Recurrence.from_dict(data), rule)
+        self.assertIsNone(Recurrence('weekly').last_day(date(2030, 1, 7)))
+
+
+class SeriesDatabaseTest(unittest.TestCase):
+
+    BACKENDS = ('json', 'journal', 'sqlite')
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp(prefix="meeting-room-test-")
+        self.monday = next_monday()
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def at(self, day: date, hour: int) -> str:
+        return datetime.combine(day, datetime.min.time()).replace(hour=hour).isoformat()
+
+    def create(self, db: Database, user_id: int, day: date, hour: int, recurrence=None):
+        return db.try_create_booking(user_id, f"user {user_id}", self.at(day, hour), self.at(day, hour + 1),
+                                     "test", recurrence=recurrence)
+
+    def test_occurrences_are_expanded_on_demand(self):
+        db = Database(self.data_dir, 'json')
+        try:
+            series = self.create(db, 1, self.monday, 10, Recurrence('weekly', count=3)).booking
+            for week in range(4):
+                day = self.monday + timedelta(weeks=week)
+                found = db.get_bookings_by_date(day.isoformat())
+                self.assertEqual([b.series_id for b in found], [series.id] if week < 3 else [])
+                self.assertEqual(db.get_bookings_by_date((day + timedelta(days=1)).isoformat()), [])
+        finally:
+            db.close()
+
+    def test_one_off_conflicts_with_occurrence(self):
+        db = Database(self.data_dir, 'json')
+        try:
+            series = self.create(db, 1, self.monday, 10, Recurrence('weekdays')).booking
+            wednesday = self.monday + timedelta(days=2)
+            result = self.create(db, 2, wednesday, 10)
+            self.assertEqual(result.status, 'conflict')
+            self.assertEqual(result.conflict.series_id, series.id)
+            self.assertTrue(self.create(db, 2, self.monday + timedelta(days=5), 10).created)
+        finally:
+            db.close()
+
+    def test_series_conflict_survives_skipped_occurrences(self):
+        for backend in self.BACKENDS:
+            with self.subTest(backend=backend):
+                data_dir = tempfile.mkdtemp(dir=self.data_dir)
+                db = Database(data_dir, backend)
+                try:
+                    series = self.create(db, 1, self.monday, 10, Recurrence('weekly')).booking
+                    # Отменяем ближайшие вхождения - за ними серия продолжается
+                    for week in range(6):
+                        self.assertTrue(db.cancel_occurrence(series.id, self.monday + timedelta(weeks=week), 1))
+                    result = self.create(db, 2, self.monday, 10, Recurrence('weekly'))
+                    self.assertEqual(result.status, 'conflict')
+                    self.assertEqual(result.conflict.series_id, series.id)
+
+                    later = self.monday + timedelta(weeks=10)
+                    self.assertEqual([b.id for b in db.get_bookings_by_date(later.isoformat())], [series.id])
+                finally:
+                    db.close()
+
+    def test_skipped_occurrence_persists(self):
+        for backend in self.BACKENDS:
+            with self.subTest(backend=backend):
+                data_dir = tempfile.mkdtemp(dir=self.data_dir)
+                db = Database(data_dir, backend)
+                series = self.create(db, 1, self.monday, 10, Recurrence('daily', count=5)).booking
+                tuesday = self.monday + timedelta(days=1)
+                self.assertTrue(db.cancel_occurrence(series.id, tuesday, 1))
+                self.assertFalse(db.cancel_occurrence(series.id, tuesday, 1))
+                self.assertTrue(self.create(db, 2, tuesday, 10).created)
+                db.close()
+
+                db = Database(data_dir, backend)
+                try:
+                    self.assertIn(tuesday, db.get_booking(series.id).recurrence.exceptions)
+                    self.assertEqual([b.user_id for b in db.get_bookings_by_date(tuesday.isoformat())], [2])
+                    for day in db.index_days():
+                        self.assertEqual(db.verify_day_index(day), 0)
+                finally:
+                    db.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
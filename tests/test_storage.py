@@ -0,0 +1,164 @@
+"""
+Восстановление хранилища после сбоев записи: падение между файлами, недописанная пачка журнала
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from datetime import timedelta
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database, now_baku  # noqa: E402
+from storage import GroupCommitter, JournalStorage, StorageCorruptedError  # noqa: E402
+
+
+def record(booking_id: int) -> dict:
+    return {'id': booking_id, 'user_id': booking_id, 'user_name': f"user {booking_id}",
+            'start_time': '2030-01-01T10:00:00', 'end_time': '2030-01-01T11:00:00',
+            'description': '', 'status': 'active'}
+
+
+class JsonCounterRecoveryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp(prefix="meeting-room-test-")
+        self.day = (now_baku() + timedelta(days=1)).date().isoformat()
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def test_stale_counter_does_not_reuse_ids(self):
+        db = Database(self.data_dir, 'json')
+        first = db.try_create_booking(1, "user 1", f"{self.day}T10:00", f"{self.day}T11:00", "first").booking
+        db.close()
+
+        # Падение между записью bookings.json и booking_id.json: счетчик остался старым
+        with open(os.path.join(self.data_dir, "booking_id.json"), 'w', encoding='utf-8') as f:
+            json.dump({'next_id': 1}, f)
+
+        db = Database(self.data_dir, 'json')
+        try:
+            second = db.try_create_booking(2, "user 2", f"{self.day}T12:00", f"{self.day}T13:00", "second").booking
+            self.assertNotEqual(second.id, first.id)
+            self.assertEqual(db.get_booking(first.id).user_id, 1)
+            self.assertTrue(db.cancel_booking(first.id, 1))
+        finally:
+            db.close()
+
+
+class GroupCommitSnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp(prefix="meeting-room-test-")
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def test_compaction_skips_changes_waiting_for_next_batch(self):
+        storage = JournalStorage(self.data_dir, compact_every=1)
+        storage.init()
+        storage.load()
+        memory = []
+        committer = GroupCommitter(storage, lambda: ([dict(r) for r in memory], len(memory) + 1),
+                                   threading.RLock(), window_ms=0)
+        # В памяти уже применены брони #1 и #2, но записывается пока только пачка с #1
+        memory += [record(1), record(2)]
+        committer.submit([{'op': 'create', 'booking': record(1)}]).result()
+        committer.close()
+
+        # Свертка после первой пачки не должна была записать бронь #2
+        bookings, next_id = JournalStorage(self.data_dir).load()
+        self.assertEqual([b['id'] for b in bookings], [1])
+        self.assertEqual(next_id, 2)
+
+    def test_failed_batch_is_not_in_committed_state(self):
+        storage = JournalStorage(self.data_dir, compact_every=1000)
+        storage.init()
+        storage.load()
+        memory = []
+        committer = GroupCommitter(storage, lambda: ([dict(r) for r in memory], len(memory) + 1),
+                                   threading.RLock(), window_ms=0)
+        commit = storage.commit
+
+        def failing_commit(mutations, snapshot):
+            raise OSError("диск недоступен")
+
+        storage.commit = failing_commit
+        memory.append(record(2))
+        with self.assertRaises(OSError):
+            committer.submit([{'op': 'create', 'booking': record(2)}], memory.clear).result()
+        self.assertEqual(memory, [])
+
+        storage.commit = commit
+        memory.append(record(3))
+        committer.submit([{'op': 'create', 'booking': record(3)}]).result()
+        self.assertGreater(committer.maintain().result(), 0)
+        committer.close()
+
+        bookings, _ = JournalStorage(self.data_dir).load()
+        self.assertEqual([b['id'] for b in bookings], [3])
+
+
+class JournalRecoveryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp(prefix="meeting-room-test-")
+        self.storage = JournalStorage(self.data_dir, durable=True)
+        self.storage.init()
+        self.storage.load()
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def create(self, booking_id: int):
+        self.storage.commit([{'op': 'create', 'booking': record(booking_id)}], lambda: ([], 1))
+
+    def test_failed_append_is_truncated(self):
+        self.create(1)
+        size = os.path.getsize(self.storage.journal_file)
+        # Запись прошла, а fsync упал (например, диск заполнен) - пачка не подтверждена
+        with mock.patch('storage.os.fsync', side_effect=OSError("No space left on device")):
+            with self.assertRaises(OSError):
+                self.create(2)
+        self.assertEqual(os.path.getsize(self.storage.journal_file), size)
+
+        self.create(3)
+        self.create(4)
+        bookings, next_id = JournalStorage(self.data_dir).load()
+        self.assertEqual([b['id'] for b in bookings], [1, 3, 4])
+        self.assertEqual(next_id, 5)
+
+    def test_torn_final_line_is_dropped(self):
+        self.create(1)
+        with open(self.storage.journal_file, 'ab') as f:
+            f.write(b'{"op": "create", "boo')
+        bookings, _ = JournalStorage(self.data_dir).load()
+        self.assertEqual([b['id'] for b in bookings], [1])
+
+        # Обрезанный хвост не склеивается со следующей записью
+        storage = JournalStorage(self.data_dir)
+        storage.load()
+        storage.commit([{'op': 'create', 'booking': record(2)}], lambda: ([], 1))
+        bookings, _ = JournalStorage(self.data_dir).load()
+        self.assertEqual([b['id'] for b in bookings], [1, 2])
+
+    def test_corrupted_line_in_the_middle_refuses_to_load(self):
+        self.create(1)
+        with open(self.storage.journal_file, 'ab') as f:
+            f.write(b'{"op": "create", "boo\n')
+        self.create(2)
+        size = os.path.getsize(self.storage.journal_file)
+        with self.assertRaises(StorageCorruptedError):
+            JournalStorage(self.data_dir).load()
+        # Подтвержденные записи после поврежденной строки не удалены
+        self.assertEqual(os.path.getsize(self.storage.journal_file), size)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -24,6 +24,7 @@ TRANSLATIONS = {
         'btn_back_to_menu': '◀️ Назад в меню',
         'btn_main_menu': '◀️ Главное меню',
         'btn_change_language': '🌐 Сменить язык',
+        'btn_next_free': '🔎 Ближайшее свободное',
         
         # Главное меню
         'main_menu': 'Главное меню. Выберите действие:',
@@ -72,6 +73,10 @@ TRANSLATIONS = {
         
         # Подтверждение и ошибки
         'time_occupied': 'Это время занято!',
+        'select_room': '🚪 <b>Выберите комнату</b>\n\nВремя: {start_time} - {end_time}',
+        'btn_any_room': '🎲 Любая свободная',
+        'room_label': '🚪 Комната: {room}',
+        'reminder': '⏰ <b>Встреча начнется через {minutes} мин.</b>\n\n📅 {date}\n⏰ {start_time} - {end_time}\n📝 {description}',
         'booking_success': '✅ <b>Бронирование создано!</b>\n\n📅 Дата: {date}\n⏰ Время: {start_time} - {end_time}\n📝 Описание: {description}',
         'booking_error': '❌ Произошла ошибка при создании бронирования. Попробуйте еще раз.',
         'time_already_booked': '❌ К сожалению, это время уже забронировано.\nПопробуйте выбрать другое время.',
@@ -80,14 +85,34 @@ TRANSLATIONS = {
         'my_bookings_empty': 'У вас пока нет активных бронирований.',
         'my_bookings_title': '<b>Ваши бронирования:</b>\n\n',
         'btn_cancel_booking': '🗑 Отменить ({time})',
+        'btn_cancel_series': '🗑 Отменить всю серию',
+        'btn_repeat': '🔁 Повторять',
+        'select_repeat': '🔁 <b>Как часто повторять?</b>',
+        'select_repeat_count': '🔁 <b>Сколько раз?</b>',
+        'repeat_none': 'Не повторять',
+        'repeat_daily': 'каждый день',
+        'repeat_weekdays': 'по будням',
+        'repeat_weekly': 'каждую неделю',
+        'repeat_count': '{count} раз',
+        'repeat_forever': 'без окончания',
+        'repeat_until': 'до {date}',
+        'repeat_label': '🔁 Повтор: {rule}',
+        'btn_prev_page': '⬅️ Ранее',
+        'btn_next_page': 'Далее ➡️',
+        'next_free_duration': '🔎 <b>Ближайшее свободное время</b>\n\nВыберите длительность встречи:',
+        'next_free_title': '🔎 <b>Ближайшие свободные окна</b>\n\nДлительность: {duration}\nВыберите окно - останется только описать встречу:',
+        'next_free_none': '😔 В ближайшие {days} дней нет свободного окна такой длительности',
+        'btn_free_window': '{date} {start_time} - {end_time}',
         'booking_cancelled': '✅ Бронирование отменено',
+        'occurrence_cancelled': '✅ Встреча {date} отменена, серия продолжается',
         'cancel_error': '❌ Ошибка при отмене',
         
         # Справка
         'help_title': '<b>ℹ️ Справка по использованию бота</b>\n\n<b>Основные функции:</b>\n\n',
         'help_view': '📅 <b>Посмотреть брони</b> - показывает все брони на ближайшую неделю\n\n',
-        'help_create': '➕ <b>Забронировать комнату</b> - создать новое бронирование:\n   1. Выберите дату\n   2. Выберите время начала\n   3. Выберите длительность\n   4. Опишите цель встречи\n\n',
+        'help_create': '➕ <b>Забронировать комнату</b> - создать новое бронирование:\n   1. Выберите дату\n   2. Выберите время начала\n   3. Выберите длительность\n   4. Опишите цель встречи (🔁 - повторять регулярно)\n\n',
         'help_my': '🗑 <b>Мои брони</b> - ваши активные бронирования с возможностью отмены\n\n',
+        'help_next': '🔎 <b>Ближайшее свободное</b> (или /next) - ближайшие свободные окна нужной длительности, бронь в пару нажатий\n\n',
         'help_rules': '<b>Правила:</b>\n• Комнату можно бронировать с 08:00 до 20:00\n• Минимальная длительность - 30 минут\n• Вы можете отменить только свои брони\n• Бронировать можно на 7 дней вперед',
     },
     
@@ -112,6 +137,7 @@ TRANSLATIONS = {
         'btn_back_to_menu': '◀️ Menyuya qayıt',
         'btn_main_menu': '◀️ Əsas menyu',
         'btn_change_language': '🌐 Dili dəyiş',
+        'btn_next_free': '🔎 Ən yaxın boş vaxt',
         
         # Главное меню
         'main_menu': 'Əsas menyu. Əməliyyatı seçin:',
@@ -160,6 +186,10 @@ TRANSLATIONS = {
         
         # Подтверждение и ошибки
         'time_occupied': 'Bu vaxt məşğuldur!',
+        'select_room': '🚪 <b>Otağı seçin</b>\n\nVaxt: {start_time} - {end_time}',
+        'btn_any_room': '🎲 İstənilən boş otaq',
+        'room_label': '🚪 Otaq: {room}',
+        'reminder': '⏰ <b>Görüş {minutes} dəqiqəyə başlayacaq.</b>\n\n📅 {date}\n⏰ {start_time} - {end_time}\n📝 {description}',
         'booking_success': '✅ <b>Rezerv yaradıldı!</b>\n\n📅 Tarix: {date}\n⏰ Vaxt: {start_time} - {end_time}\n📝 Təsvir: {description}',
         'booking_error': '❌ Rezerv yaradılarkən xəta baş verdi. Yenidən cəhd edin.',
         'time_already_booked': '❌ Təəssüf ki, bu vaxt artıq rezerv edilib.\nBaşqa vaxt seçin.',
@@ -168,22 +198,68 @@ TRANSLATIONS = {
         'my_bookings_empty': 'Hələ aktiv rezerviniz yoxdur.',
         'my_bookings_title': '<b>Sizin rezervləriniz:</b>\n\n',
         'btn_cancel_booking': '🗑 Ləğv et ({time})',
+        'btn_cancel_series': '🗑 Bütün seriyanı ləğv et',
+        'btn_repeat': '🔁 Təkrarla',
+        'select_repeat': '🔁 <b>Nə qədər tez-tez təkrarlansın?</b>',
+        'select_repeat_count': '🔁 <b>Neçə dəfə?</b>',
+        'repeat_none': 'Təkrarlama',
+        'repeat_daily': 'hər gün',
+        'repeat_weekdays': 'iş günləri',
+        'repeat_weekly': 'hər həftə',
+        'repeat_count': '{count} dəfə',
+        'repeat_forever': 'sonsuz',
+        'repeat_until': '{date} qədər',
+        'repeat_label': '🔁 Təkrar: {rule}',
+        'btn_prev_page': '⬅️ Əvvəlki',
+        'btn_next_page': 'Növbəti ➡️',
+        'next_free_duration': '🔎 <b>Ən yaxın boş vaxt</b>\n\nGörüşün müddətini seçin:',
+        'next_free_title': '🔎 <b>Ən yaxın boş pəncərələr</b>\n\nMüddət: {duration}\nPəncərəni seçin - yalnız görüşü təsvir etmək qalacaq:',
+        'next_free_none': '😔 Yaxın {days} gündə bu müddətdə boş pəncərə yoxdur',
+        'btn_free_window': '{date} {start_time} - {end_time}',
         'booking_cancelled': '✅ Rezerv ləğv edildi',
+        'occurrence_cancelled': '✅ {date} görüşü ləğv edildi, seriya davam edir',
         'cancel_error': '❌ Ləğv edərkən xəta',
         
         # Справка
         'help_title': '<b>ℹ️ Botdan istifadə üzrə kömək</b>\n\n<b>Əsas funksiyalar:</b>\n\n',
         'help_view': '📅 <b>Rezervləri göstər</b> - yaxın həftə üçün bütün rezervləri göstərir\n\n',
-        'help_create': '➕ <b>Otağı rezerv et</b> - yeni rezerv yaradın:\n   1. Tarixi seçin\n   2. Başlama vaxtını seçin\n   3. Müddəti seçin\n   4. Görüşün məqsədini yazın\n\n',
+        'help_create': '➕ <b>Otağı rezerv et</b> - yeni rezerv yaradın:\n   1. Tarixi seçin\n   2. Başlama vaxtını seçin\n   3. Müddəti seçin\n   4. Görüşün məqsədini yazın (🔁 - müntəzəm təkrarla)\n\n',
         'help_my': '🗑 <b>Mənim rezervlərim</b> - aktiv rezervləriniz və ləğv etmək imkanı\n\n',
+        'help_next': '🔎 <b>Ən yaxın boş vaxt</b> (və ya /next) - lazımi müddətdə ən yaxın boş pəncərələr, bir neçə toxunuşla rezerv\n\n',
         'help_rules': '<b>Qaydalar:</b>\n• Otağı 08:00-dan 20:00-a kimi rezerv etmək olar\n• Minimum müddət - 30 dəqiqə\n• Yalnız öz rezervlərinizi ləğv edə bilərsiniz\n• 7 gün qabaqcadan rezerv etmək olar',
     }
 }
 
 
+WEEKDAY_KEYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+MONTH_KEYS = ['january', 'february', 'march', 'april', 'may', 'june',
+              'july', 'august', 'september', 'october', 'november', 'december']
+
+
+def _compile_catalog(lang):
+    """Собрать каталог языка: недостающие ключи берутся из русского"""
+    catalog = dict(TRANSLATIONS['ru'])
+    catalog.update(TRANSLATIONS[lang])
+    return catalog
+
+
+# Каталоги собираются один раз при импорте: get_text - один поиск в словаре
+CATALOGS = {lang: _compile_catalog(lang) for lang in TRANSLATIONS}
+DEFAULT_CATALOG = CATALOGS['ru']
+
+# Названия дней недели и месяцев по индексам
+WEEKDAYS = {lang: [catalog[key] for key in WEEKDAY_KEYS] for lang, catalog in CATALOGS.items()}
+MONTHS = {lang: [catalog[key] for key in MONTH_KEYS] for lang, catalog in CATALOGS.items()}
+
+
+def get_catalog(lang):
+    """Получить каталог переводов языка (русский по умолчанию)"""
+    return CATALOGS.get(lang, DEFAULT_CATALOG)
+
+
 def get_text(lang, key, **kwargs):
     """Получить переведенный текст"""
-    text = TRANSLATIONS.get(lang, TRANSLATIONS['ru']).get(key, key)
+    text = get_catalog(lang).get(key, key)
     if kwargs:
         return text.format(**kwargs)
     return text
@@ -191,12 +267,9 @@ def get_text(lang, key, **kwargs):
 
 def get_weekday(lang, weekday):
     """Получить название дня недели"""
-    days = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
-    return get_text(lang, days[weekday])
+    return WEEKDAYS.get(lang, WEEKDAYS['ru'])[weekday]
 
 
 def get_month(lang, month):
     """Получить название месяца"""
-    months = ['january', 'february', 'march', 'april', 'may', 'june',
-              'july', 'august', 'september', 'october', 'november', 'december']
-    return get_text(lang, months[month - 1])
+    return MONTHS.get(lang, MONTHS['ru'])[month - 1]
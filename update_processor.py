@@ -0,0 +1,79 @@
+"""
+Параллельная обработка обновлений Telegram
+Обновления разных пользователей обрабатываются одновременно, одного пользователя - строго по очереди
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Dict, Hashable, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from config import UPDATE_CONCURRENCY, UPDATE_QUEUE_LIMIT
+
+logger = logging.getLogger(__name__)
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Обработчик обновлений с очередью на каждого пользователя (или чат)
+
+    Пока у пользователя выполняется обновление, следующие его обновления
+    ждут в порядке поступления - состояние ConversationHandler не гоняется
+    само с собой. Одновременно выполняется не больше concurrency обновлений.
+
+    Семафор базового класса (queue_limit) ограничивает число принятых в
+    работу обновлений вместе с ожидающими своей очереди; лимит concurrency
+    берется уже после очереди пользователя, чтобы ждущие обновления одного
+    пользователя не занимали места, нужные остальным.
+    """
+
+    def __init__(self, concurrency: int = UPDATE_CONCURRENCY, queue_limit: int = UPDATE_QUEUE_LIMIT):
+        super().__init__(max(queue_limit, concurrency))
+        self.concurrency = concurrency
+        self._running = asyncio.BoundedSemaphore(concurrency)
+        self._locks: Dict[Hashable, asyncio.Lock] = {}
+        self._waiting: Dict[Hashable, int] = {}
+
+    @staticmethod
+    def update_key(update: object) -> Optional[Hashable]:
+        """Ключ очереди: пользователь, а для обновлений без пользователя - чат"""
+        if not isinstance(update, Update):
+            return None
+        if update.effective_user is not None:
+            return 'user', update.effective_user.id
+        if update.effective_chat is not None:
+            return 'chat', update.effective_chat.id
+        return None
+
+    async def do_process_update(self, update: object, coroutine: Awaitable):
+        key = self.update_key(update)
+        if key is None:
+            async with self._running:
+                await coroutine
+            return
+
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        self._waiting[key] = self._waiting.get(key, 0) + 1
+        try:
+            # asyncio.Lock пропускает ожидающих по порядку - обновления идут как пришли
+            async with lock:
+                async with self._running:
+                    await coroutine
+        finally:
+            self._waiting[key] -= 1
+            if not self._waiting[key]:
+                # Очередь пользователя пуста - не держим блокировку в памяти
+                del self._waiting[key]
+                del self._locks[key]
+
+    async def initialize(self):
+        logger.info(f"⚡ Параллельная обработка обновлений: до {self.concurrency} одновременно, "
+                    f"по очереди для каждого пользователя")
+
+    async def shutdown(self):
+        pending = sum(self._waiting.values())
+        if pending:
+            logger.warning(f"⚠️ При остановке не обработано обновлений: {pending}")
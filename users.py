@@ -0,0 +1,159 @@
+"""
+Профили пользователей (язык интерфейса)
+LRU-кэш в памяти + снимок users.json и журнал изменений users.journal
+"""
+
+import json
+import os
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from storage import StorageCorruptedError, read_json_file, write_json_file
+
+logger = logging.getLogger(__name__)
+
+
+class UserStore:
+    """Профили пользователей с ограниченным LRU-кэшем
+
+    Чтение языка - поиск в словаре; с диска профиль читается только при
+    промахе кэша (в том числе запоминается, что профиля нет). Изменение
+    профиля - одна дописанная строка в users.journal; журнал периодически
+    сворачивается в users.json.
+    """
+
+    def __init__(self, data_dir: str, max_size: int = 10000, compact_every: int = 500,
+                 durable: bool = False):
+        self.users_file = os.path.join(data_dir, "users.json")
+        self.journal_file = os.path.join(data_dir, "users.journal")
+        self.max_size = max_size
+        self.compact_every = compact_every
+        self.durable = durable
+        self.lock = threading.Lock()
+        self._cache: "OrderedDict[str, Optional[Dict]]" = OrderedDict()
+        self._journal_entries = 0
+
+    def init(self):
+        """Создать файл пользователей, если его нет"""
+        if not os.path.exists(self.users_file):
+            write_json_file(self.users_file, {}, durable=self.durable)
+            logger.info(f"✅ Создан файл пользователей: {self.users_file}")
+        if os.path.exists(self.journal_file):
+            # Считаем записи и обрезаем оборванную строку, чтобы новые записи не склеились с ней
+            good_offset = 0
+            with open(self.journal_file, 'rb') as f:
+                for raw in f:
+                    if not raw.endswith(b'\n'):
+                        break
+                    good_offset += len(raw)
+                    self._journal_entries += 1
+            if os.path.getsize(self.journal_file) > good_offset:
+                logger.warning("⚠️ Оборванная строка в журнале пользователей отброшена")
+                with open(self.journal_file, 'r+b') as f:
+                    f.truncate(good_offset)
+
+    def _remember(self, key: str, profile: Optional[Dict]):
+        """Положить профиль в кэш, вытеснив самый давно использованный"""
+        self._cache[key] = profile
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+
+    def _load_one(self, key: str) -> Optional[Dict]:
+        """Прочитать профиль с диска: снимок, затем более свежие записи журнала"""
+        profile = read_json_file(self.users_file, {}).get(key)
+        if os.path.exists(self.journal_file):
+            with open(self.journal_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # оборванная строка после падения
+                    if entry.get('user_id') == key:
+                        profile = entry['profile']
+        return profile
+
+    def get(self, user_id: int) -> Optional[Dict]:
+        """Получить профиль пользователя"""
+        key = str(user_id)
+        with self.lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+            profile = self._load_one(key)
+            self._remember(key, profile)
+            return profile
+
+    def get_language(self, user_id: int) -> Optional[str]:
+        """Получить язык пользователя"""
+        try:
+            profile = self.get(user_id)
+        except StorageCorruptedError:
+            return None
+        return profile.get('language') if profile else None
+
+    def cached_language(self, user_id: int):
+        """Язык из кэша без обращения к диску и без ожидания блокировки
+        
+        Возвращает (True, язык) при попадании и (False, None), если профиля нет
+        в кэше или блокировку держит запись - тогда нужен обычный get_language.
+        """
+        if not self.lock.acquire(blocking=False):
+            return False, None
+        try:
+            key = str(user_id)
+            if key not in self._cache:
+                return False, None
+            self._cache.move_to_end(key)
+            profile = self._cache[key]
+            return True, (profile.get('language') if profile else None)
+        finally:
+            self.lock.release()
+
+    def set(self, user_id: int, profile: Dict):
+        """Сохранить профиль: одна строка в журнал, затем обновление кэша"""
+        key = str(user_id)
+        line = json.dumps({'user_id': key, 'profile': profile}, ensure_ascii=False) + '\n'
+        with self.lock:
+            with open(self.journal_file, 'a', encoding='utf-8') as f:
+                f.write(line)
+                if self.durable:
+                    f.flush()
+                    os.fsync(f.fileno())
+            self._remember(key, profile)
+            self._journal_entries += 1
+
+            if self._journal_entries >= self.compact_every:
+                try:
+                    self._compact_locked()
+                except StorageCorruptedError:
+                    # Поврежденный снимок не перезаписываем - журнал продолжает расти
+                    logger.error("❌ users.json поврежден, свертка журнала пользователей отложена")
+
+    def _compact_locked(self):
+        """Свернуть журнал в users.json (вызывается под self.lock)"""
+        users = read_json_file(self.users_file, {})
+        if os.path.exists(self.journal_file):
+            with open(self.journal_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    users[entry['user_id']] = entry['profile']
+        write_json_file(self.users_file, users, durable=self.durable)
+        with open(self.journal_file, 'w', encoding='utf-8'):
+            pass
+        logger.info(f"🗜 Журнал пользователей свернут ({self._journal_entries} записей)")
+        self._journal_entries = 0
+
+    def compact(self) -> int:
+        """Свернуть журнал пользователей в users.json; возвращает размер свернутого журнала"""
+        with self.lock:
+            if not self._journal_entries:
+                return 0
+            size = os.path.getsize(self.journal_file) if os.path.exists(self.journal_file) else 0
+            self._compact_locked()
+            return size